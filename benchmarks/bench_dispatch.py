@@ -0,0 +1,125 @@
+"""
+Mail the letters of a synthetic schedule to a local stand-in SMTP server.
+
+Needs aiosmtpd (pip install aiosmtpd). The server answers after --latency-ms
+like a real relay would, and rejects a share of the messages with a
+transient 451 to exercise the retries. Compared: one connection per
+message, sent one after the other, against dispatch_letters (pooled
+connections, concurrent senders); then the same batch again, which the send
+log must skip entirely.
+
+    python benchmarks/bench_dispatch.py --professors 500 --latency-ms 20
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import smtplib
+import socket
+import sys
+import tempfile
+import time
+from email.message import EmailMessage
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aiosmtpd.controller import Controller
+from docx import Document
+from docx.shared import Inches
+
+from bench_logo import write_noise_png
+from dispatch import dispatch_letters
+from index import add_letter, load_schedule_data, schedule_letters
+from letters import iter_letter_documents
+from synthetic import write_synthetic_schedule
+
+
+class StandInHandler:
+    def __init__(self, latency, failure_rate, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.received = 0
+        self.rejected = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            self.rejected += 1
+            return '451 Try again later'
+        self.received += 1
+        return '250 OK'
+
+
+def send_unpooled(port, layout, logo_path, letters, addresses):
+    """
+    The baseline: one connection per message, one message at a time.
+    """
+    documents = iter_letter_documents(Document, layout, 4, logo_path, Inches(4), letters)
+    for professor, data in documents:
+        message = EmailMessage()
+        message['From'] = 'scolarite@example.org'
+        message['To'] = addresses[' '.join(professor.split()).casefold()]
+        message['Subject'] = 'Convocation'
+        message.add_attachment(data, maintype='application', subtype='octet-stream', filename='convocation.docx')
+        with smtplib.SMTP('127.0.0.1', port) as connection:
+            try:
+                connection.send_message(message)
+            except smtplib.SMTPDataError:
+                pass  # no retries in the baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--professors', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--failure-rate', type=float, default=0.02)
+    parser.add_argument('--pool', type=int, default=4)
+    parser.add_argument('--senders', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'schedule.xlsx')
+        write_synthetic_schedule(workbook, args.professors, 200, 0.03)
+        logo_path = os.path.join(tmp, 'logo.png')
+        write_noise_png(logo_path, 50 * 1024)
+        letters = schedule_letters(load_schedule_data(workbook))
+        addresses = {' '.join(str(professor).split()).casefold(): f'prof{number}@example.org'
+                     for number, (professor, _) in enumerate(letters)}
+        layout = partial(add_letter, session="Normale", periode="Printemps", au="2023/2024", today=datetime.date.today())
+
+        handler = StandInHandler(args.latency_ms / 1000, args.failure_rate)
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        controller = Controller(handler, hostname='127.0.0.1', port=port)
+        controller.start()
+        try:
+            start = time.perf_counter()
+            send_unpooled(port, layout, logo_path, letters, addresses)
+            elapsed = time.perf_counter() - start
+            print(f"{'unpooled':>10}: {elapsed:6.2f} s, {len(letters) / elapsed:6.1f} letters/s, "
+                  f"{handler.received} received, {handler.rejected} rejected (not retried)")
+
+            handler.received = handler.rejected = 0
+            log_path = os.path.join(tmp, 'send_log.jsonl')
+            send = partial(dispatch_letters, Document, layout, 4, logo_path, Inches(4), letters, addresses,
+                           'scolarite@example.org', log_path, host='127.0.0.1', port=port,
+                           pool_size=args.pool, senders=args.senders, backoff=0.05)
+            start = time.perf_counter()
+            counts = send()
+            elapsed = time.perf_counter() - start
+            print(f"{'pooled':>10}: {elapsed:6.2f} s, {len(letters) / elapsed:6.1f} letters/s, "
+                  f"{handler.received} received, {handler.rejected} rejected and retried, {counts}")
+
+            start = time.perf_counter()
+            counts = send()
+            print(f"{'resumed':>10}: {time.perf_counter() - start:6.2f} s, {counts}")
+        finally:
+            controller.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare the pandas ingestion path with the streaming one on a synthetic sheet.
+
+    python benchmarks/bench_ingestion.py --professors 2000 --slots 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from extraction import extract_assignments, extract_slot_catalog
+from index import pretreatment, read_excel_file
+from ingestion import stream_assignments
+from synthetic import write_synthetic_schedule
+
+
+def pandas_assignments(file_path, mark):
+    raw_data_df = read_excel_file(file_path)
+    return extract_assignments(raw_data_df, pretreatment(raw_data_df), mark), extract_slot_catalog(raw_data_df), None
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--professors', type=int, default=2000)
+    parser.add_argument('--slots', type=int, default=500)
+    parser.add_argument('--density', type=float, default=0.02)
+    parser.add_argument('--mark', choices=['star', 'room'], default='star')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.xlsx')
+        marked = write_synthetic_schedule(path, args.professors, args.slots, args.density, args.mark)
+        print(f"{args.professors} x {args.slots} sheet, {marked} marked cells, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        for name, function in [('pandas', pandas_assignments), ('streaming', stream_assignments)]:
+            (assignments, *_), elapsed, peak = measure(function, path, args.mark)
+            print(f"{name:>10}: {elapsed:6.2f} s, peak {peak / 1e6:7.1f} MB, {len(assignments)} assignments")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Time letters with a large logo: run.add_picture per letter against letters.Logo.
+
+    python benchmarks/bench_logo.py --professors 300 --logo-mb 1
+"""
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docx import Document
+from docx.shared import Inches
+
+from letters import Logo
+
+
+def write_noise_png(path, size_bytes):
+    """
+    Write an RGB PNG of random pixels, which does not compress, of about size_bytes.
+    """
+    side = int((size_bytes / 3) ** 0.5)
+    raw = b''.join(b'\x00' + os.urandom(side * 3) for _ in range(side))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    with open(path, 'wb') as png:
+        png.write(b'\x89PNG\r\n\x1a\n')
+        png.write(chunk(b'IHDR', struct.pack('>IIBBBBB', side, side, 8, 2, 0, 0, 0)))
+        png.write(chunk(b'IDAT', zlib.compress(raw, 1)))
+        png.write(chunk(b'IEND', b''))
+
+
+def letters_with_add_picture(logo_path, professors, output):
+    doc = Document()
+    for professor in range(professors):
+        doc.add_paragraph().add_run().add_picture(logo_path, width=Inches(4))
+        doc.add_paragraph(f"A Mme/ Mr: Pr. {professor}")
+        doc.add_page_break()
+    doc.save(output)
+
+
+def letters_with_logo(logo_path, professors, output):
+    doc = Document()
+    logo = Logo(doc, logo_path, width=Inches(4))
+    for professor in range(professors):
+        logo.add_to(doc.add_paragraph().add_run())
+        doc.add_paragraph(f"A Mme/ Mr: Pr. {professor}")
+        doc.add_page_break()
+    doc.save(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--professors', type=int, default=300)
+    parser.add_argument('--logo-mb', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logo_path = os.path.join(tmp, 'logo.png')
+        write_noise_png(logo_path, int(args.logo_mb * 1024 * 1024))
+        print(f"logo {os.path.getsize(logo_path) / 1e6:.2f} MB, {args.professors} professors")
+
+        for name, function in [('add_picture', letters_with_add_picture), ('Logo', letters_with_logo)]:
+            output = os.path.join(tmp, f'{name}.docx')
+            start = time.perf_counter()
+            function(logo_path, args.professors, output)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>12}: {elapsed:6.2f} s, {os.path.getsize(output) / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
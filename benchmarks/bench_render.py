@@ -0,0 +1,75 @@
+"""
+Time letter rendering: python-docx calls per letter against letters.LetterTemplate.
+
+    python benchmarks/bench_render.py --professors 500 --assignments 6
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docx import Document
+from docx.shared import Inches
+
+from bench_logo import write_noise_png
+from index import add_letter
+from letters import LetterTemplate, Logo
+
+
+def synthetic_rows(professors, assignments):
+    return {
+        f"Pr. Synthetic {professor}": [
+            [f"Module {slot}", f"Lundi {12 + slot % 5}/02/2024", "09H00 - 10H30", "SMP3"]
+            for slot in range(professor % assignments + 1)
+        ]
+        for professor in range(professors)
+    }
+
+
+def with_python_docx(schedule, logo_path):
+    doc = Document()
+    logo = Logo(doc, logo_path, width=Inches(4))
+    today = datetime.date.today()
+    for professor, rows in schedule.items():
+        add_letter(doc, logo, professor, rows, "Normale", "Printemps", "2023/2024", today)
+    return doc
+
+
+def with_template(schedule, logo_path):
+    doc = Document()
+    logo = Logo(doc, logo_path, width=Inches(4))
+    today = datetime.date.today()
+    template = LetterTemplate(doc, lambda professor, rows: add_letter(doc, logo, professor, rows, "Normale", "Printemps", "2023/2024", today), columns=4)
+    for professor, rows in schedule.items():
+        template.render(professor, rows)
+    return doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--professors', type=int, default=500)
+    parser.add_argument('--assignments', type=int, default=6, help="maximum assignments per professor")
+    args = parser.parse_args()
+
+    schedule = synthetic_rows(args.professors, args.assignments)
+    with tempfile.TemporaryDirectory() as tmp:
+        logo_path = os.path.join(tmp, 'logo.png')
+        write_noise_png(logo_path, 20 * 1024)
+
+        bodies = {}
+        for name, function in [('python-docx', with_python_docx), ('template', with_template)]:
+            start = time.perf_counter()
+            doc = function(schedule, logo_path)
+            elapsed = time.perf_counter() - start
+            bodies[name] = doc.element.body.xml
+            print(f"{name:>12}: {elapsed:6.2f} s for {args.professors} letters")
+
+    print("identical document body:", bodies['python-docx'] == bodies['template'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Peak memory of one large convocation document against the number of
+professors: the whole document built in memory then saved (write_letters)
+against the letters streamed into the package batch by batch
+(write_letters_streaming).
+
+Every run is a fresh process, so that its peak RSS is its own; the baseline
+is the peak of a process that only imported the libraries and built the
+letter rows.
+
+    python benchmarks/bench_streaming.py --professors 500 1000 2000 4000 --batch-size 200
+"""
+import argparse
+import datetime
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docx import Document
+from docx.shared import Inches
+
+from bench_logo import write_noise_png
+from bench_render import synthetic_rows
+from index import add_letter
+from letters import write_letters
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode, professors, assignments, batch_size, logo_path, output):
+    letters = list(synthetic_rows(professors, assignments).items())
+    layout = partial(add_letter, session="Normale", periode="Printemps", au="2023/2024", today=datetime.date.today())
+    start = time.perf_counter()
+    if mode == 'memory':
+        write_letters(output, Document, layout, 4, logo_path, Inches(4), letters)
+    elif mode == 'streaming':
+        write_letters(output, Document, layout, 4, logo_path, Inches(4), letters, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"{peak_rss_mb():.1f} {elapsed:.3f}")
+
+
+def run(mode, professors, args, logo_path, output):
+    command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--professors', str(professors),
+               '--assignments', str(args.assignments), '--batch-size', str(args.batch_size),
+               '--logo', logo_path, '--output', output]
+    peak, elapsed = subprocess.run(command, check=True, capture_output=True, text=True).stdout.split()
+    return float(peak), float(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--professors', type=int, nargs='+', default=[500, 1000, 2000, 4000])
+    parser.add_argument('--assignments', type=int, default=6, help="maximum assignments per professor")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--child', choices=['baseline', 'memory', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--logo', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.professors[0], args.assignments, args.batch_size, args.logo, args.output)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logo_path = os.path.join(tmp, 'logo.png')
+        write_noise_png(logo_path, 50 * 1024)
+        output = os.path.join(tmp, 'convocations.docx')
+        print(f"{'professors':>10} {'baseline MB':>12} {'in memory MB':>13} {'s':>7} {'streaming MB':>13} {'s':>7} {'docx MB':>8}")
+        for professors in args.professors:
+            baseline, _ = run('baseline', professors, args, logo_path, output)
+            memory, memory_s = run('memory', professors, args, logo_path, output)
+            streaming, streaming_s = run('streaming', professors, args, logo_path, output)
+            print(f"{professors:>10} {baseline:>12.1f} {memory:>13.1f} {memory_s:>7.2f} {streaming:>13.1f} {streaming_s:>7.2f} "
+                  f"{os.path.getsize(output) / 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
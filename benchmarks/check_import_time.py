@@ -0,0 +1,76 @@
+"""
+Check that the GUIs open their window without loading the heavy libraries.
+
+The top-level imports of each GUI script (what runs before the window is
+shown; the pipeline is imported later by import_pipeline) are replayed in a
+fresh interpreter under `python -X importtime`. The check fails when they
+load one of HEAVY_MODULES or take longer than the budget (best of --repeat).
+
+    python benchmarks/check_import_time.py --budget-ms 150
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+GUI_SCRIPTS = ['index_gui.py', 'profs_convocations.py']
+HEAVY_MODULES = ['pandas', 'numpy', 'docx', 'openpyxl', 'lxml']
+BUDGET_MS = 150.0
+
+
+def startup_imports(script):
+    """
+    Return the source of the import statements at the top level of script.
+    """
+    with open(os.path.join(ROOT, script), encoding='utf-8') as source:
+        tree = ast.parse(source.read())
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_times(code):
+    """
+    Run code under -X importtime; return {module: cumulative µs} of everything it imported
+    and the total µs of its own imports.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    modules, total = {}, 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+        if not name[1:].startswith(' '):  # imported by code itself, not by another module
+            total += int(cumulative)
+    return modules, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scripts', nargs='*', default=GUI_SCRIPTS)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS, help="allowed import time before the window")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    failures = 0
+    for script in args.scripts:
+        code = startup_imports(script)
+        runs = [import_times(code) for _ in range(args.repeat)]
+        modules, total = min(runs, key=lambda run: run[1])
+        heavy = sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES))
+        slowest = sorted(modules.items(), key=lambda item: -item[1])[:3]
+        print(f"{script:<24} {total / 1000:7.1f} ms (budget {args.budget_ms:.0f} ms)  slowest: "
+              + ', '.join(f"{name} {micros / 1000:.1f} ms" for name, micros in slowest))
+        if heavy:
+            failures += 1
+            print(f"FAIL {script} loads {', '.join(heavy)} before the window is shown")
+        if total / 1000 > args.budget_ms:
+            failures += 1
+            print(f"FAIL {script} startup imports take {total / 1000:.1f} ms")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
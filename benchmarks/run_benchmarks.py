@@ -0,0 +1,159 @@
+"""
+Stage-by-stage benchmark of the convocation pipeline on synthetic schedules.
+
+For every (professors, slots, density) case a workbook is generated with
+synthetic.write_synthetic_schedule (merged header cells, like the real
+sheets, "*" marks as read by index.py), then each stage is timed on its own: pd.read_excel, pretreatment,
+grouping_profs_info_in_a_dict, generate_docx (letter rendering) and
+doc.save. The best of --repeat runs is kept and the results are written as
+JSON; --compare flags the stages slower than a previous results file.
+
+    python benchmarks/run_benchmarks.py --professors 200 1000 --slots 300 --output results.json
+    python benchmarks/run_benchmarks.py --professors 200 1000 --slots 300 --compare results.json
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import docx
+import pandas as pd
+from docx import Document
+from docx.shared import Inches
+
+from bench_logo import write_noise_png
+from index import add_letter, grouping_profs_info_in_a_dict, pretreatment, read_excel_file
+from letters import render_document
+from synthetic import write_synthetic_schedule
+
+STAGES = ['read_excel', 'pretreatment', 'grouping', 'generate_docx', 'save']
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_stages(workbook, logo_path):
+    """
+    Run the pipeline once on workbook and return the seconds spent in each stage.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    raw_data_df = read_excel_file(workbook)
+    timings['read_excel'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processed_data_df = pretreatment(raw_data_df)
+    timings['pretreatment'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    schedule_data = grouping_profs_info_in_a_dict(raw_data_df, processed_data_df)
+    timings['grouping'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    letters = [(professor, schedule_data.display_rows(professor)) for professor in schedule_data]
+    layout = partial(add_letter, session="Normale", periode="Printemps", au="2023/2024", today=datetime.date.today())
+    doc = render_document(Document, layout, 4, logo_path, Inches(4), letters)
+    timings['generate_docx'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    doc.save(io.BytesIO())
+    timings['save'] = time.perf_counter() - start
+
+    return timings, len(schedule_data), schedule_data.assignment_count
+
+
+def run_case(tmp, logo_path, professors, slots, density, mark, repeat):
+    workbook = os.path.join(tmp, f'schedule_{professors}x{slots}_{density}.xlsx')
+    marked = write_synthetic_schedule(workbook, professors, slots, density, mark, merged=True)
+    best = {}
+    for _ in range(repeat):
+        timings, letters, assignments = run_stages(workbook, logo_path)
+        for stage, seconds in timings.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+    return {
+        'professors': professors, 'slots': slots, 'density': density, 'mark': mark,
+        'marked_cells': marked, 'letters': letters, 'assignments': assignments,
+        'workbook_bytes': os.path.getsize(workbook),
+        'seconds': best, 'total_seconds': sum(best.values()),
+    }
+
+
+def case_key(case):
+    return (case['professors'], case['slots'], case['density'], case['mark'])
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Print the stages slower than in baseline_path by more than tolerance; return how many.
+    """
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = {case_key(case): case for case in json.load(baseline_file)['cases']}
+    regressions = 0
+    for case in results['cases']:
+        previous = baseline.get(case_key(case))
+        if previous is None:
+            continue
+        for stage in STAGES:
+            before, now = previous['seconds'].get(stage), case['seconds'][stage]
+            if before and now > before * (1 + tolerance) and now - before > 0.05:
+                regressions += 1
+                print(f"REGRESSION {case_key(case)} {stage}: {before:.3f} s -> {now:.3f} s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--professors', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--slots', type=int, nargs='+', default=[200])
+    parser.add_argument('--density', type=float, nargs='+', default=[0.02])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="previous results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown per stage (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'python_docx': getattr(docx, '__version__', None),
+        'machine': platform.platform(),
+        'cases': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        logo_path = os.path.join(tmp, 'logo.png')
+        write_noise_png(logo_path, 50 * 1024)
+        for professors in args.professors:
+            for slots in args.slots:
+                for density in args.density:
+                    case = run_case(tmp, logo_path, professors, slots, density, 'star', args.repeat)
+                    results['cases'].append(case)
+                    stages = '  '.join(f"{stage} {case['seconds'][stage]:.3f}" for stage in STAGES)
+                    print(f"{professors:>6} profs x {slots:>4} slots @ {density:<5} {case['assignments']:>7} assignments  {stages}")
+
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(results, output, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.tolerance) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import datetime
+import random
+
+from openpyxl import Workbook
+
+DAYS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi']
+TIMES = ['09H00 - 10H30', '11H00 - 12H30', '14H00 - 15H30', '16H00 - 17H30']
+NIVEAUX = ['SMP1', 'SMP3', 'SMP5', 'SMC1', 'SMC3', 'SV3', 'SV5', 'TC IA', 'BCG1']
+DEPARTMENTS = ['Physique', 'Chimie', 'Biologie', 'Informatique', 'Mathématiques']
+
+
+def write_synthetic_schedule(path, professors=2000, slots=500, density=0.02, mark='star', seed=0, merged=False):
+    """
+    Write an exam schedule in the layout read_excel_file/pretreatment expect.
+
+    3 title rows, then the date, time, duration, niveau and subject header
+    rows, the "Enseignants" row and one row per professor (department,
+    name, one column per slot, two total columns). Every cell of the
+    professors x slots grid is marked with probability density, with "*"
+    (mark='star') or a room code ending with a digit (mark='room').
+
+    Dates span several times and times several slots; only the first cell
+    of each group holds the value. With merged=True those groups (and the
+    department column) are real merged cells like in the faculty's sheets,
+    which needs a regular, slower, workbook instead of a write-only one.
+    Returns the number of marked cells.
+    """
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=not merged)
+    if merged:
+        sheet = workbook.active
+        sheet.title = 'Enseignants'
+    else:
+        sheet = workbook.create_sheet('Enseignants')
+
+    sheet.append([])
+    sheet.append([None, None, 'Calendrier de Surveillance des examens (synthetique)'])
+    sheet.append([])
+
+    # One date spans several times, one time spans several slots: like merged
+    # cells, only the first column of each group holds the value.
+    slots_per_time = max(1, slots // (len(DAYS) * len(TIMES) * 2))
+    first_day = datetime.date(2024, 2, 12)
+    dates, times = [], []
+    for slot in range(slots):
+        group, offset = divmod(slot, slots_per_time)
+        day, time = divmod(group, len(TIMES))
+        dates.append(None if offset or time else f"{DAYS[day % len(DAYS)]} {(first_day + datetime.timedelta(days=day)).strftime('%d/%m/%Y')}")
+        times.append(None if offset else TIMES[time])
+
+    sheet.append([None, None] + dates)
+    sheet.append([None, None] + times)
+    sheet.append([None, None] + [None if time is None else '1h30' for time in times])
+    sheet.append([None, 'Semestre'] + [NIVEAUX[slot % len(NIVEAUX)] for slot in range(slots)])
+    sheet.append([None, 'Module'] + [f'Module {slot}' for slot in range(slots)])
+    sheet.append([None, 'Enseignants'] + [None] * slots + ['Total', 'Total Hs'])
+
+    marked = 0
+    first_professor_row = 10
+    for professor in range(professors):
+        department = DEPARTMENTS[professor * len(DEPARTMENTS) // professors]
+        row = [department, f'Pr. Synthetic {professor}']
+        count = 0
+        for slot in range(slots):
+            if rng.random() < density:
+                row.append('*' if mark == 'star' else f'ES{rng.randint(1, 30)}')
+                count += 1
+            else:
+                row.append(None)
+        row += [count, count * 1.5]
+        sheet.append(row)
+        marked += count
+
+    if merged:
+        _merge_groups(sheet, 4, dates)
+        _merge_groups(sheet, 5, times)
+        departments = [DEPARTMENTS[professor * len(DEPARTMENTS) // professors] for professor in range(professors)]
+        start = 0
+        for end in range(1, professors + 1):
+            if end == professors or departments[end] != departments[start]:
+                if end - start > 1:
+                    sheet.merge_cells(start_row=first_professor_row + start, start_column=1,
+                                      end_row=first_professor_row + end - 1, end_column=1)
+                start = end
+
+    workbook.save(path)
+    return marked
+
+
+def _merge_groups(sheet, row, values):
+    """
+    Merge each filled header cell of row with the empty cells following it.
+    Merging clears the covered cells, which are empty anyway.
+    """
+    starts = [slot for slot, value in enumerate(values) if value is not None] + [len(values)]
+    for start, end in zip(starts, starts[1:]):
+        if end - start > 1:
+            sheet.merge_cells(start_row=row, start_column=start + 3, end_row=row, end_column=end + 2)
@@ -0,0 +1,20 @@
+import os
+
+
+def dump_frame(frame, debug_dump, file_path, stage, sheet=None):
+    """
+    Write an intermediate frame of the pipeline to <debug_dump>/<workbook>_<stage>.csv,
+    or <debug_dump>/<workbook>_<sheet>_<stage>.csv for the frames of one sheet of several.
+
+    debug_dump is the directory receiving the dumps; when it is None (the
+    default everywhere) nothing is written.
+    """
+    if not debug_dump:
+        return None
+    os.makedirs(debug_dump, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    if sheet is not None:
+        stem = f"{stem}_{sheet}"
+    path = os.path.join(debug_dump, f"{stem}_{stage}.csv")
+    frame.to_csv(path)
+    return path
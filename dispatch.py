@@ -0,0 +1,254 @@
+import csv
+import datetime
+import hashlib
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+from incremental import letter_hash
+from instrumentation import stage
+from letters import iter_letter_documents, letter_filename
+
+DOCX_TYPE = ('application', 'vnd.openxmlformats-officedocument.wordprocessingml.document')
+SUBJECT = "Convocation aux surveillances des examens"
+BODY = """Cher(e) collègue,
+
+Veuillez trouver ci-joint votre convocation aux surveillances des examens.
+
+Cordialement,
+"""
+
+
+def normalize_name(name):
+    """
+    Key matching the professors of the schedule with the address file: case and spacing are ignored.
+    """
+    return ' '.join(str(name).split()).casefold()
+
+
+def load_addresses(path):
+    """
+    Read the professor -> e-mail mapping from a CSV file with 'professor' and 'email' columns.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as addresses_file:
+        return {
+            normalize_name(row['professor']): row['email'].strip()
+            for row in csv.DictReader(addresses_file)
+            if row.get('professor') and row.get('email')
+        }
+
+
+def letter_key(professor, rows, context=()):
+    """
+    Send log key of a letter: the professor's normalized name, and the hash of
+    its content together with its context (workbook, session, period, year),
+    so that the same rows in another document are mailed again. The date
+    printed is left out: a dispatch resumed the next day does not mail the
+    letters already sent.
+    """
+    digest = hashlib.sha256(json.dumps([[str(part) for part in context], letter_hash(professor, rows)]).encode('utf-8')).hexdigest()
+    return normalize_name(professor), digest
+
+
+class SMTPPool:
+    """
+    A few persistent SMTP connections shared by the sending threads.
+
+    Connections are opened on first use, up to size, and handed back after
+    each message. One that failed is closed instead, and replaced by a new
+    one the next time it is needed.
+    """
+
+    def __init__(self, host, port=25, size=2, starttls=False, username=None, password=None, timeout=30):
+        self.host, self.port = host, port
+        self.starttls = starttls
+        self.username, self.password = username, password
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self.opened += 1
+        return connection
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                yield connection
+            except BaseException:
+                _close(connection)
+                raise
+            self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                _close(connection)
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except OSError:
+        pass
+
+
+def _is_permanent(error):
+    """
+    Refused addresses and 5xx answers are not retried.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    code = getattr(error, 'smtp_code', None)
+    return code is not None and 500 <= code < 600
+
+
+def send_with_retry(pool, message, retries=3, backoff=1.0):
+    """
+    Send message through pool, retrying transient failures after backoff, 2*backoff... seconds.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with pool.connection() as connection:
+                connection.send_message(message)
+            return attempt
+        except (smtplib.SMTPException, OSError) as error:
+            if attempt == retries or _is_permanent(error):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+class SendLog:
+    """
+    Append-only JSON lines record of the messages sent, so that an
+    interrupted batch resumes where it stopped. A letter is skipped when the
+    same professor already received the same content.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sent = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as log_file:
+                for line in log_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # line cut by a crash
+                    if entry.get('status') == 'sent':
+                        self.sent.add((entry['professor'], entry['hash']))
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.sent
+
+    def write(self, **entry):
+        entry['at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def dispatch_letters(new_document, add_letter, columns, logo_path, logo_width, letters, addresses, sender, log_path,
+                     host='localhost', port=25, starttls=False, username=None, password=None,
+                     pool_size=2, senders=4, retries=3, backoff=1.0, subject=SUBJECT, progress=None, report=None, context=()):
+    """
+    Mail every professor's letter, as a .docx attachment, to its address in addresses.
+
+    The letters are rendered one by one (letters.iter_letter_documents) while
+    up to senders threads send the previous ones over a pool of pool_size
+    SMTP connections. Every outcome is appended to the log at log_path; the
+    letters it records as sent, with unchanged content and context (see
+    letter_key), are skipped. Returns the count of letters sent, skipped,
+    failed and without an address.
+    """
+    counts = {'sent': 0, 'skipped': 0, 'failed': 0, 'no_address': 0}
+    log = SendLog(log_path)
+    pool = SMTPPool(host, port, pool_size, starttls, username, password)
+    pending = []
+    for professor, rows in letters:
+        key = letter_key(professor, rows, context)
+        if key in log:
+            counts['skipped'] += 1
+        elif key[0] not in addresses:
+            counts['no_address'] += 1
+            log.write(professor=key[0], hash=key[1], status='no_address')
+        else:
+            pending.append(((professor, rows), key))
+
+    done = 0
+    lock = threading.Lock()
+    # bounds the rendered letters waiting for a sender
+    in_flight = threading.BoundedSemaphore(senders * 2)
+
+    def send(number, professor, key, data):
+        nonlocal done
+        try:
+            message = EmailMessage()
+            message['From'] = sender
+            message['To'] = addresses[key[0]]
+            message['Subject'] = subject
+            message.set_content(BODY)
+            message.add_attachment(data, maintype=DOCX_TYPE[0], subtype=DOCX_TYPE[1],
+                                   filename=letter_filename(number, professor))
+            retried = send_with_retry(pool, message, retries, backoff)
+        except Exception as error:
+            # SMTP and network errors, but also a malformed address in the CSV
+            log.write(professor=key[0], hash=key[1], email=addresses[key[0]], status='failed', error=str(error))
+            status = 'failed'
+        else:
+            log.write(professor=key[0], hash=key[1], email=addresses[key[0]], status='sent', retries=retried)
+            status = 'sent'
+        finally:
+            in_flight.release()
+        with lock:
+            counts[status] += 1
+            done += 1
+            if progress is not None:
+                progress(done, len(pending))
+
+    with stage(report, 'dispatch') as record:
+        try:
+            futures = []
+            with ThreadPoolExecutor(max_workers=senders) as executor:
+                documents = iter_letter_documents(new_document, add_letter, columns, logo_path, logo_width,
+                                                  [letter for letter, _ in pending])
+                for number, ((professor, data), (_, key)) in enumerate(zip(documents, pending), start=1):
+                    in_flight.acquire()
+                    futures.append(executor.submit(send, number, professor, key, data))
+            for future in futures:
+                future.result()  # raises what send could not log (the log itself failing)
+        finally:
+            pool.close()
+            log.close()
+        record.update(counts)
+        record['connections'] = pool.opened
+    return counts
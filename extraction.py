@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from slot_catalog import SlotCatalog, parse_day, parse_time_range
+
+# Marker flavours found in the schedules: "*" cells (index.py, index_gui.py)
+# or room codes such as "ES5" (profs_convocations.py).
+STAR_MARK = "star"
+ROOM_MARK = "room"
+
+# Rows of raw_data_df holding the slot headers, after pretreatment.
+DATE_ROW = 0
+TIME_ROW = 1
+NIVEAU_ROW = 3
+SUBJECT_ROW = 4
+
+
+def marked_cells_mask(processed_data_df: pd.DataFrame, mark=STAR_MARK):
+    """
+    Return a boolean mask of the marked cells of the professors grid.
+    """
+    values = processed_data_df.to_numpy(dtype=object)
+    if mark == STAR_MARK:
+        return values == "*"
+
+    # Room codes end with a digit. The professor column and the two trailing
+    # total columns are never rooms.
+    mask = np.zeros(values.shape, dtype=bool)
+    grid = values[:, 1:-2]
+    filled = pd.notna(grid)
+    cells = pd.Series(grid[filled], dtype=object)
+    mask[:, 1:-2][filled] = cells.str.contains(r"\d$", regex=True, na=False).to_numpy()
+    return mask
+
+
+def extract_slot_catalog(raw_data_df: pd.DataFrame):
+    """
+    Return the SlotCatalog of the pretreated sheet, one slot per column.
+    """
+    headers = raw_data_df.iloc[[SUBJECT_ROW, DATE_ROW, TIME_ROW, NIVEAU_ROW], :].to_numpy(dtype=object)
+    return SlotCatalog(*headers)
+
+
+def has_schedule_headers(dates, times):
+    """
+    Tell whether a sheet is laid out as a schedule, from its date and time
+    header rows: at least one readable date and one readable start time.
+    """
+    return (any(parse_day(date) is not None for date in dates)
+            and any(parse_time_range(time)[0] is not None for time in times))
+
+
+def extract_assignments(raw_data_df: pd.DataFrame, processed_data_df: pd.DataFrame, mark=STAR_MARK):
+    """
+    Return one row per marked cell (professor, slot[, local]), in the grid's row-major order.
+    slot is the sheet column of the exam, its headers are in extract_slot_catalog(raw_data_df).
+    """
+    mask = marked_cells_mask(processed_data_df, mark)
+    rows, cols = np.nonzero(mask)
+
+    assignments = pd.DataFrame({
+        'professor': processed_data_df.iloc[:, 0].to_numpy(dtype=object)[rows],
+        'slot': cols,
+    })
+    if mark == ROOM_MARK:
+        assignments['local'] = processed_data_df.to_numpy(dtype=object)[rows, cols]
+    return assignments
+
+
+def professor_roster(processed_data_df: pd.DataFrame):
+    """
+    Return the professors listed in the grid, marked cells or not, once each in sheet order.
+    """
+    return list(pd.unique(processed_data_df.iloc[:, 0].dropna()))
+
+
+def _strip(professor):
+    return professor.strip() if isinstance(professor, str) else professor
+
+
+def merge_sheets(sheets):
+    """
+    Merge the (name, assignments, catalog, roster) of the sheets of a workbook
+    into one assignments frame, SlotCatalog and roster. The slots of each sheet
+    follow those of the previous sheets; a professor listed on several sheets
+    (departments) gets one entry with all their assignments, the names being
+    compared without their surrounding spaces.
+    """
+    frames, offset = [], 0
+    for _, assignments, catalog, _ in sheets:
+        frames.append(assignments.assign(slot=assignments['slot'].to_numpy() + offset))
+        offset += len(catalog)
+    assignments = pd.concat(frames, ignore_index=True)
+    assignments['professor'] = assignments['professor'].map(_strip)
+    catalog = SlotCatalog.concat([catalog for _, _, catalog, _ in sheets], [name for name, _, _, _ in sheets])
+    roster = list(dict.fromkeys(_strip(professor) for _, _, _, roster in sheets for professor in roster))
+    return assignments, catalog, roster
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from docx import Document
+
+from instrumentation import stage
+from letters import Logo, _adopt, render_document
+from schedule_cache import CACHE_DIR, MAX_CACHE_BYTES, evict, workbook_hash
+
+# Bump whenever the letter layout changes, so that documents rendered by an
+# older version are not spliced into.
+LETTERS_VERSION = 1
+
+
+def letter_hash(professor, rows):
+    """
+    Return the hash of one letter's content: the professor and the table cells.
+    """
+    return hashlib.sha256(json.dumps([str(professor), rows], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def layout_id(add_letter):
+    """
+    Identify the function laying out the letters (index.add_letter, index_gui.add_letter...),
+    partial or not, by its source file and name: __module__ is '__main__' for a script.
+    """
+    function = getattr(add_letter, 'func', add_letter)
+    return f"{os.path.basename(function.__code__.co_filename)}:{function.__qualname__}"
+
+
+def letters_key(key, columns, logo_path, layout=None, logo_digest=None):
+    """
+    Identify the cached document of a series of letters. key holds what the
+    letters depend on besides their rows (workbook, session, period, year...),
+    layout the function laying them out (layout_id), as the command line and
+    the GUIs print different letters for the same key.
+    The date printed in the letters is deliberately left out: unchanged
+    letters keep the date they were first issued. logo_digest, when already
+    known, spares hashing the logo again.
+    """
+    if logo_digest is None:
+        logo_digest = workbook_hash(logo_path)
+    parts = [str(part) for part in key] + [columns, logo_digest, layout, LETTERS_VERSION]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _letter_elements(doc):
+    body = doc.element.body
+    sectPr = body.sectPr
+    return [element for element in body if element is not sectPr]
+
+
+def _load_manifest(docx_path, manifest_path):
+    """
+    Return the manifest of the cached document, or None when either is missing.
+    """
+    if not os.path.exists(docx_path):
+        return None
+    try:
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_document(docx_path, manifest):
+    """
+    Return the cached document, or None when it does not match its manifest.
+    """
+    try:
+        doc = Document(docx_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(_letter_elements(doc)) != manifest['elements_per_letter'] * len(manifest['letters']):
+        return None
+    return doc
+
+
+def _save_atomic(save, path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_letters_incremental(filename, new_document, add_letter, columns, logo_path, logo_width, letters, key,
+                              changes_filename=None, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES,
+                              progress=None, report=None, renderer=None):
+    """
+    Render only the letters that changed since the last run with the same key,
+    and splice them into the full document of that run.
+
+    The full document of every key is kept in cache_dir with a manifest
+    holding the hash of each professor's letter, in order. The letters whose
+    hash differs (or that are new) are rendered into changes_filename when
+    given (removed when none changed), then moved into the cached document in place of their old version;
+    the letters of professors no longer in the schedule are dropped and the
+    order follows letters. The full document is copied to filename, a path or
+    a writable binary stream.
+    Without a usable cache every letter counts as changed. A LetterRenderer
+    prepared for this layout renders the changed letters and gives the logo
+    digest. Returns the saved paths.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    logo_digest = None if renderer is None else renderer.logo_digest
+    entry = os.path.join(cache_dir, f"letters-{letters_key(key, columns, logo_path, layout_id(add_letter), logo_digest)}")
+    docx_path, manifest_path = entry + '.docx', entry + '.json'
+
+    with stage(report, 'diff') as record:
+        hashes = [letter_hash(professor, rows) for professor, rows in letters]
+        manifest = _load_manifest(docx_path, manifest_path)
+        previous = {} if manifest is None else dict(manifest['letters'])
+        changed = [letter for letter, digest in zip(letters, hashes) if previous.get(str(letter[0])) != digest]
+        names = [str(professor) for professor, _ in letters]
+        removed = set(previous) - set(names)
+        record['changed'] = len(changed)
+        record['removed'] = len(removed)
+        record['cached'] = manifest is not None
+    if changes_filename is not None and not changed and os.path.exists(changes_filename):
+        # the changes of an earlier run would pass for this run's
+        os.remove(changes_filename)
+
+    saved = []
+    reordered = manifest is None or [name for name, _ in manifest['letters']] != names
+    if changed or removed or reordered:
+        doc = None
+        if manifest is not None:
+            # the cached document is only parsed when something has to change in it
+            with stage(report, 'open_cached'):
+                doc = _load_document(docx_path, manifest)
+            if doc is None:
+                manifest, changed = None, letters
+        with stage(report, 'render', profile=True) as record:
+            record['letters'] = len(changed)
+            if renderer is not None:
+                changes = renderer.render(changed, progress)
+            else:
+                changes = render_document(new_document, add_letter, columns, logo_path, logo_width, changed, progress)
+        if changes_filename is not None and changed:
+            with stage(report, 'save_changes'):
+                changes.save(changes_filename)
+            saved.append(changes_filename)
+
+        with stage(report, 'splice'):
+            new_elements = _letter_elements(changes)
+            if changed:
+                elements_per_letter = len(new_elements) // len(changed)
+            else:
+                elements_per_letter = manifest['elements_per_letter'] if manifest is not None else 0
+            if doc is None:
+                doc = new_document()
+            # ids are taken while the kept letters are still in the document
+            next_shape_id = doc.part.next_id
+            old_elements = _letter_elements(doc)
+            kept = {} if manifest is None else manifest
+            per = kept.get('elements_per_letter', 0)
+            segments = {name: old_elements[i * per:(i + 1) * per] for i, (name, _) in enumerate(kept.get('letters', []))}
+            for element in old_elements:
+                doc.element.body.remove(element)
+            if changed:
+                logo = Logo(doc, logo_path, width=logo_width)
+                for i, (professor, _) in enumerate(changed):
+                    segment = new_elements[i * elements_per_letter:(i + 1) * elements_per_letter]
+                    for element in segment:
+                        next_shape_id = _adopt(element, logo, next_shape_id)
+                    segments[str(professor)] = segment
+            sectPr = doc.element.body.sectPr
+            for name in names:
+                for element in segments[name]:
+                    sectPr.addprevious(element)
+
+        with stage(report, 'save'):
+            _save_atomic(doc.save, docx_path)
+            manifest = {'elements_per_letter': elements_per_letter, 'letters': [list(letter) for letter in zip(names, hashes)]}
+            _save_atomic(lambda path: _write_json(manifest, path), manifest_path)
+    else:
+        os.utime(docx_path)  # mark as recently used
+        os.utime(manifest_path)
+
+    with stage(report, 'copy'):
+        if isinstance(filename, (str, os.PathLike)):
+            shutil.copyfile(docx_path, filename)
+        else:
+            with open(docx_path, 'rb') as cached:
+                shutil.copyfileobj(cached, filename)
+    evict(cache_dir, max_bytes)
+    return [filename] + saved
+
+
+def _write_json(data, path):
+    with open(path, 'w', encoding='utf-8') as json_file:
+        json.dump(data, json_file, ensure_ascii=False)
@@ -6,6 +6,21 @@ from docx.oxml import parse_xml
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 # from datetime import date
 import datetime
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from dispatch import dispatch_letters, load_addresses
+from incremental import write_letters_incremental
+from extraction import STAR_MARK, extract_assignments, extract_slot_catalog
+from instrumentation import PipelineReport
+from letters import LetterRenderer, write_letter_archive, write_letters
+from pipeline import load_schedule, load_schedule_data, pretreatment
+from schedule_checks import write_schedule_checks
+from schedule_table import ScheduleTable
 
 def read_excel_file(file_path):
     """
@@ -14,19 +29,6 @@ def read_excel_file(file_path):
     return pd.read_excel(file_path, skiprows=3, header=None, index_col=[0], engine='openpyxl')
 
 
-##### PRETREATMENT #####
-def pretreatment(raw_data_df):
-    """
-    Perform pretreatment on the DataFrame.
-    """
-    raw_data_df.iloc[7:, 0] = raw_data_df.iloc[7:, 0].ffill()
-    raw_data_df.iloc[0, :] = raw_data_df.iloc[0, :].ffill()
-    raw_data_df.iloc[1, :] = raw_data_df.iloc[1, :].ffill()
-    raw_data_df.to_excel("raw_data_df.xlsx", index=False)
-    return raw_data_df.iloc[6:,:]
-
-# processed_data_df.to_excel("processed_data_df.xlsx", index=False)
-
 """
     @raw_data_df: big dataframe containing original excel file with header=None and 3 rows skipped
     @processed_data_df: Region of interest extracted from raw_data_df 
@@ -34,102 +36,321 @@ def pretreatment(raw_data_df):
 """
 def grouping_profs_info_in_a_dict(raw_data_df:pd.DataFrame, processed_data_df:pd.DataFrame):
 
-    schedule_data = {}
-    # print("professor   subject   date   time niveau")
-    for x, row in enumerate(processed_data_df.values):  
-        for y, value in enumerate(row):    
-            if value == "*":
-                professor = processed_data_df.iloc[x, 0]
-                date = raw_data_df.iloc[0, y]
-                time = raw_data_df.iloc[1, y]
-                niveau = raw_data_df.iloc[3, y]
-                subject = raw_data_df.iloc[4, y]
-                # print(f"{professor}\t{subject}\t{date}\t{time}\t{niveau}")
-                schedule_info = {'subject': subject, 'date': date, 'time': time,'niveau':niveau}
-                if professor in schedule_data:
-                    schedule_data[professor].append(schedule_info)
-                else:
-                    schedule_data[professor] = [schedule_info]
-    return schedule_data
+    assignments = extract_assignments(raw_data_df, processed_data_df, mark=STAR_MARK)
+    return ScheduleTable.from_assignments(assignments, extract_slot_catalog(raw_data_df))
+
+def add_letter(doc, logo, professor, rows, session, periode, au, today):
+    """
+    Add one professor's letter to the document, rows being the table cells as strings.
+    """
+    # Add professor's name as heading
+    # doc.add_picture('endark.png', width=Inches(4))
+    logo_paragraph = doc.add_paragraph()
+
+    # Add the logo to the paragraph
+    logo_run = logo_paragraph.add_run()
+    logo.add_to(logo_run)
+
+    # Set the alignment of the parag¨raph to centered
+    logo_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    doc.add_paragraph()
+    doc.add_paragraph()
+
+    doc.add_paragraph(f"A Mme/ Mr: {professor}")
+    # doc.add_heading(f"Professor: {professor}", level=1)
+    doc.add_paragraph()
+
+    doc.add_paragraph(f"Objet: Convocation aux surveillances des Examens")
+    doc.add_paragraph("Cher(e) collègue,")
+    # Create a table for the subjects
+    doc.add_paragraph(f" Nous vous saurions gé de bien vouloir prendre toutes les dispositions nécessaires pour assurer la surveillance des épreuves écrites de la session {session} de {periode} {au} aux jours et horaires indiqués ci-dessus:")
+    doc.add_paragraph()
+    table = doc.add_table(rows=1, cols=4)
+    table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = 'Subject'
+    hdr_cells[1].text = 'Date'
+    hdr_cells[2].text = 'Time'
+    hdr_cells[3].text = 'Niveau'
+    # hdr_cells[4].text = 'Local'
+    
+    # Add each subject, date, and time as a row in the table
+    for subject, date, hour, niveau in rows:
+        row_cells = table.add_row().cells
+        row_cells[0].text = subject
+        row_cells[1].text = date
+        row_cells[2].text = hour
+        row_cells[3].text = niveau
+    doc.add_paragraph()
+
+    doc.add_paragraph("Nous vous remercions de votre précieuse collaboration")
+    # Add a page break between professors
+    doc.add_paragraph(f"Ait Melloul le: {today.strftime('%d-%m-%Y')} ").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
+    doc.add_paragraph()
+    doc.add_paragraph(f"Le doyen").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
+
+    doc.add_page_break()
+
+def schedule_letters(schedule_data):
+    """
+    Return the (professor, table rows) of every letter, the cells being strings
+    formatted once per slot, the rows in chronological order.
+    """
+    return [(professor, schedule_data.display_rows(professor)) for professor in schedule_data]
 
 """
     @schedule_data: dict containing all info about profs schedules extracted from dataframe
     @return: generate a docx file 
 """
-def generate_docx(schedule_data:dict, session="Normale", periode="Printemps",au="2023/2024"):
+def generate_docx(schedule_data:dict, session="Normale", periode="Printemps",au="2023/2024", workers=1, chunk_size=None, split=False,
+                  logo_path='endark.png', filename=None, progress=None, report=None, incremental_key=None, archive=False,
+                  batch_size=None, renderers=None):
     """
     Generate a DOCX document from schedule data.
+    filename is the path of the document or a writable binary stream (e.g. a BytesIO).
+    With workers > 1 the letters are rendered in chunks by a process pool; split=True
+    keeps one .docx per chunk instead of merging them. With incremental_key, only the
+    letters changed since the last run with that key are rendered, into <filename>_changes.docx,
+    and spliced into the cached full document. With archive=True, filename receives a zip
+    archive holding one .docx per professor. With batch_size, the letters are streamed into
+    filename batch_size at a time, memory staying flat whatever the number of professors.
+    renderers is a dict kept by a process generating many documents (service.py): the
+    LetterRenderer of each session, periode, au and logo is prepared once and reused.
     """
-    doc = Document()
     today = datetime.date.today()
-    for professor, info_list in schedule_data.items():
-        # Add professor's name as heading
-        # doc.add_picture('endark.png', width=Inches(4))
-        logo_paragraph = doc.add_paragraph()
+    letters = schedule_letters(schedule_data)
+    # the letter is built once through python-docx, then cloned for every professor
+    layout = partial(add_letter, session=session, periode=periode, au=au, today=today)
+    renderer = None
+    if renderers is not None:
+        for stale in [key for key in renderers if key[3] != today]:
+            del renderers[stale]  # the letters print the date
+        key = (session, periode, au, today, logo_path)
+        if key not in renderers:
+            renderers[key] = LetterRenderer(Document, layout, 4, logo_path, Inches(4))
+        renderer = renderers[key]
+
+    if filename is None:
+        filename = f"invitations_profs_{today.strftime('%Y_%m_%d')}.docx"  # Format date in YYYY-MM-DD format
+    if archive:
+        return [write_letter_archive(filename, Document, layout, 4, logo_path, Inches(4), letters, progress, report)]
+    if incremental_key is not None:
+        changes_filename = f"{os.path.splitext(filename)[0]}_changes.docx" if isinstance(filename, str) else None
+        return write_letters_incremental(filename, Document, layout, 4, logo_path, Inches(4), letters, incremental_key,
+                                         changes_filename, progress=progress, report=report, renderer=renderer)
+    return write_letters(filename, Document, layout, 4, logo_path, Inches(4), letters, workers, chunk_size, split, progress, report,
+                         batch_size, renderer)
+
+def dispatch_docx(schedule_data, addresses, sender, log_path, session="Normale", periode="Printemps", au="2023/2024",
+                  logo_path='endark.png', smtp=None, progress=None, report=None, excel_path=None):
+    """
+    Mail every professor's letter on its own to its address (see dispatch.dispatch_letters).
+    smtp holds the server and concurrency options. The letters already mailed are skipped
+    for the same workbook (excel_path), session, periode and au, whatever the day the
+    dispatch is resumed on. Returns the counts of the dispatch.
+    """
+    today = datetime.date.today()
+    layout = partial(add_letter, session=session, periode=periode, au=au, today=today)
+    return dispatch_letters(Document, layout, 4, logo_path, Inches(4), schedule_letters(schedule_data), addresses, sender, log_path,
+                            progress=progress, report=report,
+                            context=(excel_path and os.path.abspath(excel_path), session, periode, au),
+                            **(smtp or {}))
+
+def print_progress(label, done, total):
+    """
+    Progress callback of the command line: print about every 5% of the letters.
+    """
+    if done == total or done % max(1, total // 20) == 0:
+        print(f"{label}: {done}/{total} letters", file=sys.stderr, flush=True)
+
+def process_workbook(excel_path, documents, au, logo_path, streaming=False, use_cache=True,
+                     workers=1, chunk_size=None, split=False, progress=None, debug_dump=None,
+                     trace_memory=False, profile_dir=None, incremental=False, archive=False, checks_path=None,
+                     dispatch=None, batch_size=None, schedule_data=None, renderers=None):
+    """
+    Parse one workbook once and generate its documents, a list of (session, periode, filename).
+    progress(done, total) follows the letters of each document. Returns the timings of the run,
+    with the stage by stage PipelineReport under 'report'. With profile_dir, the render stage of
+    each document is profiled into <profile_dir>/<document>.prof. With incremental, only the
+    letters changed since the last run on the same workbook and options are rendered. With
+    archive, each document is a zip of one .docx per professor. With checks_path, the
+    conflicts, load and room occupancy of the schedule are written there as an Excel workbook.
+    With dispatch, a dict of dispatch_docx arguments, each professor's letter is also mailed.
+    With batch_size, each document is streamed batch_size letters at a time. An already parsed
+    schedule_data (a ScheduleTable of excel_path) skips the parsing, and renderers keeps the
+    prepared letter layouts between runs (see generate_docx).
+    """
+    report = PipelineReport(trace_memory=trace_memory)
+    start = time.perf_counter()
+    if schedule_data is None:
+        # an unchanged workbook is not parsed again
+        schedule_data = load_schedule(excel_path, STAR_MARK, streaming, use_cache, debug_dump, report)
+    parsed = time.perf_counter()
+    outputs = []
+    conflicts = None
+    sent = {}
+    if checks_path:
+        with report.stage('checks') as record:
+            conflicts = record['conflicts'] = write_schedule_checks(schedule_data, checks_path)
+    for session, periode, filename in documents:
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            report.profile_path = os.path.join(profile_dir, os.path.splitext(os.path.basename(filename))[0] + ".prof")
+        incremental_key = (os.path.abspath(excel_path), session, periode, au) if incremental else None
+        outputs += generate_docx(schedule_data, session, periode, au, workers, chunk_size, split, logo_path, filename, progress, report,
+                                 incremental_key, archive, batch_size, renderers)
+        if dispatch:
+            mailed = dispatch_docx(schedule_data, session=session, periode=periode, au=au, logo_path=logo_path, report=report,
+                                   excel_path=excel_path, **dispatch)
+            for status, count in mailed.items():
+                sent[status] = sent.get(status, 0) + count
+    done = time.perf_counter()
+    return {'professors': len(schedule_data), 'parse': parsed - start, 'render': done - parsed, 'outputs': outputs,
+            'conflicts': conflicts, 'sent': sent, 'report': report}
+
+def find_workbooks(paths):
+    """
+    Expand the given files and directories into the list of .xlsx workbooks.
+    """
+    workbooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            workbooks += sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith('.xlsx') and not name.startswith('~$')  # skip Excel lock files
+            )
+        else:
+            workbooks.append(path)
+    return workbooks
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the professors' invigilation convocations from exam schedules.")
+    parser.add_argument("workbooks", nargs="*", default=["schedule.xlsx"], help="Excel schedules or directories of schedules")
+    parser.add_argument("--session", nargs="+", default=["Normale"], help="one document per session, e.g. Normale Rattrappage")
+    parser.add_argument("--periode", nargs="+", default=["Printemps"], help="one document per period, e.g. Automne Printemps")
+    parser.add_argument("--au", default="2023/2024", help="année universitaire (20XX/20YY)")
+    parser.add_argument("--logo", default="endark.png", help="logo printed on top of every letter")
+    parser.add_argument("--output-dir", default=".", help="directory receiving the .docx files")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="workbooks processed concurrently (default: one per CPU, shared with --workers, at most one per workbook)")
+    parser.add_argument("--workers", type=int, default=1, help="processes rendering the letters of one document")
+    parser.add_argument("--chunk-size", type=int, default=None, help="professors per chunk (default: one chunk per worker)")
+    parser.add_argument("--split", action="store_true", help="save one .docx per chunk instead of merging them")
+    parser.add_argument("--streaming", action="store_true", help="read the workbooks row by row")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", help="always parse the workbooks")
+    parser.add_argument("--progress", action="store_true", help="report the letters rendered on stderr")
+    parser.add_argument("--debug-dump", metavar="DIR", default=None, help="write the intermediate frames of each workbook as CSV into DIR")
+    parser.add_argument("--no-checks", dest="checks", action="store_false",
+                        help="skip the schedule_checks_<workbook>.xlsx report of conflicts, load and room occupancy")
+    parser.add_argument("--zip", action="store_true", help="write a .zip of one .docx per professor instead of a single document")
+    parser.add_argument("--batch-size", type=int, default=None, metavar="N",
+                        help="stream the letters into the document N at a time, keeping memory flat on very large runs")
+    parser.add_argument("--incremental", action="store_true", help="only render the letters changed since the last run, into <output>_changes.docx, and update the full document")
+    parser.add_argument("--report", metavar="FILE", default=None, help="write the stage by stage timings of every workbook as JSON")
+    parser.add_argument("--show-report", action="store_true", help="print the stage by stage timings of every workbook")
+    parser.add_argument("--trace-memory", action="store_true", help="measure allocations per stage with tracemalloc (slower)")
+    parser.add_argument("--profile-render", metavar="DIR", default=None, help="cProfile the render stage into DIR/<document>.prof")
+    mail = parser.add_argument_group("e-mail dispatch", "mail each professor's letter on its own (password in $SMTP_PASSWORD)")
+    mail.add_argument("--send", metavar="ADDRESSES", default=None, help="CSV file with 'professor' and 'email' columns")
+    mail.add_argument("--sender", default=None, help="From address of the messages")
+    mail.add_argument("--smtp-host", default="localhost")
+    mail.add_argument("--smtp-port", type=int, default=25)
+    mail.add_argument("--smtp-starttls", action="store_true")
+    mail.add_argument("--smtp-user", default=None)
+    mail.add_argument("--smtp-pool", type=int, default=2, help="persistent SMTP connections")
+    mail.add_argument("--senders", type=int, default=4, help="messages sent concurrently")
+    mail.add_argument("--retries", type=int, default=3, help="attempts after a transient failure")
+    args = parser.parse_args(argv)
+    if args.send and not args.sender:
+        parser.error("--send needs --sender")
+    if args.zip and (args.split or args.incremental):
+        parser.error("--zip cannot be combined with --split or --incremental")
+    if args.batch_size and (args.split or args.zip or args.incremental or args.workers > 1):
+        parser.error("--batch-size writes one document from one process: not with --split, --zip, --incremental or --workers")
+    return args
+
+def main(argv=None):
+    """
+    Batch entry point: each workbook is parsed once, in parallel with the others, and gives
+    one document per (session, periode) combination.
+    """
+    args = parse_args(argv)
+    today = datetime.date.today()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    batch_start = time.perf_counter()
+    workbooks = find_workbooks(args.workbooks)
+    addresses = load_addresses(args.send) if args.send else None
+    combinations = [(session, periode) for session in args.session for periode in args.periode]
+    if args.jobs is None:
+        # each job renders with --workers processes of its own
+        args.jobs = min(len(workbooks), (os.cpu_count() or 1) // max(1, args.workers))
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        for excel_path in workbooks:
+            documents = []
+            extension = ".zip" if args.zip else ".docx"
+            for session, periode in combinations:
+                if len(workbooks) == 1 and len(combinations) == 1:
+                    name = f"invitations_profs_{today.strftime('%Y_%m_%d')}{extension}"
+                else:
+                    stem = os.path.splitext(os.path.basename(excel_path))[0]
+                    name = f"invitations_profs_{stem}_{session}_{periode}_{today.strftime('%Y_%m_%d')}{extension}"
+                documents.append((session, periode, os.path.join(args.output_dir, name)))
+            checks_path = None
+            if args.checks:
+                stem = os.path.splitext(os.path.basename(excel_path))[0]
+                checks_path = os.path.join(args.output_dir, f"schedule_checks_{stem}_{today.strftime('%Y_%m_%d')}.xlsx")
+            dispatch = None
+            if args.send:
+                stem = os.path.splitext(os.path.basename(excel_path))[0]
+                dispatch = {
+                    'addresses': addresses, 'sender': args.sender,
+                    'log_path': os.path.join(args.output_dir, f"send_log_{stem}.jsonl"),
+                    'smtp': {
+                        'host': args.smtp_host, 'port': args.smtp_port, 'starttls': args.smtp_starttls,
+                        'username': args.smtp_user, 'password': os.environ.get('SMTP_PASSWORD'),
+                        'pool_size': args.smtp_pool, 'senders': args.senders, 'retries': args.retries,
+                    },
+                }
+            future = executor.submit(
+                process_workbook, excel_path, documents, args.au, args.logo, args.streaming, args.use_cache,
+                args.workers, args.chunk_size, args.split,
+                partial(print_progress, excel_path) if args.progress else None, args.debug_dump,
+                args.trace_memory, args.profile_render, args.incremental, args.zip,
+                checks_path, dispatch, args.batch_size,
+            )
+            jobs[future] = excel_path
+
+        failures = 0
+        reports = {}
+        print(f"{'workbook':<40} {'profs':>6} {'docs':>5} {'clash':>6} {'parse s':>8} {'render s':>9}")
+        for future in as_completed(jobs):
+            excel_path = jobs[future]
+            try:
+                timings = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"{excel_path:<40} failed: {e}")
+                continue
+            conflicts = '-' if timings['conflicts'] is None else timings['conflicts']
+            print(f"{excel_path:<40} {timings['professors']:>6} {len(timings['outputs']):>5} {conflicts:>6} "
+                  f"{timings['parse']:>8.2f} {timings['render']:>9.2f}")
+            reports[excel_path] = timings['report']
+            skipped = [name for record in timings['report'].stages for name in record.get('skipped_sheets', ())]
+            if skipped:
+                print(f"{'':<40} sheets not read as schedules: {', '.join(skipped)}")
+            if timings['sent']:
+                print(f"{'':<40} mailed: " + ", ".join(f"{count} {status}" for status, count in timings['sent'].items()))
+    if args.show_report:
+        for excel_path, report in reports.items():
+            print(f"\n{excel_path}\n{report.format()}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as report_file:
+            json.dump({excel_path: report.as_dict() for excel_path, report in reports.items()}, report_file, indent=2, default=str)
+    print(f"{len(workbooks)} workbook(s), {failures} failed, {time.perf_counter() - batch_start:.2f} s")
+    return 1 if failures else 0
 
-    # Add the logo to the paragraph
-        logo_run = logo_paragraph.add_run()
-        logo_run.add_picture('endark.png', width=Inches(4))  # Adjust the width as needed
-
-        # Set the alignment of the parag¨raph to centered
-        logo_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        doc.add_paragraph()
-        doc.add_paragraph()
-
-        doc.add_paragraph(f"A Mme/ Mr: {professor}")
-        # doc.add_heading(f"Professor: {professor}", level=1)
-        doc.add_paragraph()
-
-        doc.add_paragraph(f"Objet: Convocation aux surveillances des Examens")
-        doc.add_paragraph("Cher(e) collègue,")
-        # Create a table for the subjects
-        doc.add_paragraph(f" Nous vous saurions gé de bien vouloir prendre toutes les dispositions nécessaires pour assurer la surveillance des épreuves écrites de la session {session} de {periode} {au} aux jours et horaires indiqués ci-dessus:")
-        doc.add_paragraph()
-        table = doc.add_table(rows=1, cols=4)
-        table.style = 'Table Grid'
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Subject'
-        hdr_cells[1].text = 'Date'
-        hdr_cells[2].text = 'Time'
-        hdr_cells[3].text = 'Niveau'
-        # hdr_cells[4].text = 'Local'
-        
-        # Add each subject, date, and time as a row in the table
-        for info in info_list:
-            subject = info['subject']
-            date = info['date']
-            time = info['time']
-            niveau = info['niveau']
-            row_cells = table.add_row().cells
-            row_cells[0].text = subject
-            row_cells[1].text = date
-            row_cells[2].text = time
-            row_cells[3].text = niveau
-        doc.add_paragraph()
-
-        doc.add_paragraph("Nous vous remercions de votre précieuse collaboration")
-        # Add a page break between professors
-        doc.add_paragraph(f"Ait Melloul le: {today.strftime('%d-%m-%Y')} ").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
-        doc.add_paragraph()
-        doc.add_paragraph(f"Le doyen").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
-
-        doc.add_page_break()
-
-    # Save the document
-    # today = str(date.today()).replace('-', '_')
-    # filename = f"invitations_profs_{today}.docx"
-      # Get the current date
-    filename = f"invitations_profs_{today.strftime('%Y_%m_%d')}.docx"  # Format date in YYYY-MM-DD format
-    doc.save(filename)
-
-def main():
-
-    excel_path = "schedule.xlsx"
-    raw_data_df = read_excel_file(file_path=excel_path)
-    processed_data_df = pretreatment(raw_data_df=raw_data_df)
-
-    schedule_data = grouping_profs_info_in_a_dict(raw_data_df=raw_data_df, processed_data_df=processed_data_df)
-    generate_docx(schedule_data)
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
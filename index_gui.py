@@ -1,13 +1,43 @@
+import multiprocessing
+import os
+import queue
+import threading
 import tkinter as tk
-from tkinter import filedialog, messagebox
-import pandas as pd
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from tkinter import filedialog, messagebox, ttk
 import datetime
-from docx.shared import Cm
-from docx.shared import Pt
-from docx.oxml.ns import qn
+from functools import partial
+from instrumentation import PipelineReport
+
+# The libraries below take seconds to load in the packaged exe: the window
+# imports them on a background thread once it is shown (see the end of the file).
+_pipeline_lock = threading.Lock()
+
+def import_pipeline():
+    """
+    Import the libraries the generation needs (pandas, python-docx, openpyxl...).
+    Importing them again is free.
+    """
+    global pd, Document, Inches, WD_PARAGRAPH_ALIGNMENT, Cm, Pt, qn, STAR_MARK, extract_assignments, extract_slot_catalog
+    global load_schedule, pretreatment, write_letters_incremental, Cancelled, write_letter_archive, write_letters
+    global write_schedule_checks, ScheduleTable
+    with _pipeline_lock:
+        import pandas as pd
+        from docx import Document
+        from docx.shared import Inches
+        from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+        from docx.shared import Cm
+        from docx.shared import Pt
+        from docx.oxml.ns import qn
+        from extraction import STAR_MARK, extract_assignments, extract_slot_catalog
+        from incremental import write_letters_incremental
+        from letters import Cancelled, write_letter_archive, write_letters
+        from pipeline import load_schedule, pretreatment
+        from schedule_checks import write_schedule_checks
+        from schedule_table import ScheduleTable
+
+if __name__ != "__main__":
+    # imported as a module, or by a process pool worker: needed right away
+    import_pipeline()
 
 today = datetime.date.today()
 
@@ -18,104 +48,117 @@ def read_excel_file():
     file_path = filedialog.askopenfilename()
     return file_path
 
-def process_excel(file_path, session, period, au):
+def process_excel(file_path, session, period, au, streaming=False, use_cache=True, workers=1, progress=None, debug_dump=None,
+                  report=None, incremental=False, filename=None):
     """
-    Process Excel file and generate DOCX document.
+    Process Excel file and generate DOCX document, saved straight to filename (a .docx, or a .zip
+    of one document per professor). The conflicts, load and room occupancy of the schedule are
+    written next to it, in <filename>_checks.xlsx.
+    The parsed schedule is cached per workbook content, so an unchanged file is not parsed again.
+    progress(done, total) is called as letters are rendered and may raise Cancelled.
+    With incremental, only the letters changed since the last run on the same file and options are rendered.
+    Returns the PipelineReport of the run (report, or a new one).
     """
-    raw_data_df = pd.read_excel(file_path, skiprows=3, header=None, index_col=[0], engine='openpyxl')
-    processed_data_df = pretreatment(raw_data_df)
-    schedule_data = grouping_profs_info_in_a_dict(raw_data_df, processed_data_df)
-    generate_docx(schedule_data, session, period, au)
+    if report is None:
+        report = PipelineReport()
+    schedule_data = load_schedule(file_path, STAR_MARK, streaming, use_cache, debug_dump, report)
+    if isinstance(filename, str):
+        with report.stage('checks') as record:
+            record['conflicts'] = write_schedule_checks(schedule_data, f"{os.path.splitext(filename)[0]}_checks.xlsx")
+    incremental_key = (os.path.abspath(file_path), session, period, au) if incremental else None
+    archive = filename is not None and filename.lower().endswith('.zip')
+    generate_docx(schedule_data, session, period, au, workers=workers, progress=progress, report=report, incremental_key=incremental_key,
+                  filename=filename, archive=archive)
+    return report
 
-def pretreatment(raw_data_df):
+def grouping_profs_info_in_a_dict(raw_data_df, processed_data_df):
     """
-    Perform pretreatment on the DataFrame.
+    Group information about professors' schedules in a dictionary.
     """
-    raw_data_df.iloc[7:, 0] = raw_data_df.iloc[7:, 0].ffill()
-    raw_data_df.iloc[0, :] = raw_data_df.iloc[0, :].ffill()
-    raw_data_df.iloc[1, :] = raw_data_df.iloc[1, :].ffill()
-    raw_data_df.to_excel("raw_data_df.xlsx", index=False)
-    return raw_data_df.iloc[6:,:]
+    assignments = extract_assignments(raw_data_df, processed_data_df, mark=STAR_MARK)
+    return ScheduleTable.from_assignments(assignments, extract_slot_catalog(raw_data_df))
 
-def grouping_profs_info_in_a_dict(raw_data_df, processed_data_df):
+def add_letter(doc, logo, professor, rows, session, period, au):
     """
-    Group information about professors' schedules in a dictionary.
+    Add one professor's letter to the document, rows being the table cells as strings.
     """
-    schedule_data = {}
-    for x, row in enumerate(processed_data_df.values):  
-        for y, value in enumerate(row):    
-            if value == "*":
-                professor = processed_data_df.iloc[x, 0]
-                date = raw_data_df.iloc[0, y]
-                time = raw_data_df.iloc[1, y]
-                niveau = raw_data_df.iloc[3, y]
-                subject = raw_data_df.iloc[4, y]
-                schedule_info = {'subject': subject, 'date': date, 'time': time, 'niveau': niveau}
-                if professor in schedule_data:
-                    schedule_data[professor].append(schedule_info)
-                else:
-                    schedule_data[professor] = [schedule_info]
-    return schedule_data
-
-def generate_docx(schedule_data, session, period, au):
+    logo_paragraph = doc.add_paragraph()
+    logo_run = logo_paragraph.add_run()
+    logo.add_to(logo_run)
+    logo_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    doc.add_paragraph()
+    doc.add_paragraph(f"A Mme/ Mr: {professor}")
+    doc.add_paragraph(f"Objet: Convocation aux surveillances des Examens")
+    doc.add_paragraph("Cher(e) collègue,")
+    doc.add_paragraph(f"Nous vous saurions gé de bien vouloir prendre toutes les dispositions nécessaires pour assurer la surveillance des épreuves écrites de la session {session} de {period} {au} aux jours et horaires indiqués ci-dessus:")
+    doc.add_paragraph()
+
+    table = doc.add_table(rows=1, cols=4)
+    table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = 'Module'
+    hdr_cells[1].text = 'Date'
+    hdr_cells[2].text = 'Temps'
+    hdr_cells[3].text = 'Niveau'
+    #
+    for cell in hdr_cells:
+        for paragraph in cell.paragraphs:
+            for run in paragraph.runs:
+                run.bold = True
+    #
+    table.allow_autofit = True  
+    for subject, date, time, niveau in rows:
+        row_cells = table.add_row().cells
+        row_cells[0].text = subject
+        row_cells[1].text = date
+        row_cells[2].text = time
+        row_cells[3].text = niveau
+    doc.add_paragraph()
+
+    doc.add_paragraph("Nous vous remercions de votre précieuse collaboration")
+    doc.add_paragraph()
+    doc.add_paragraph()
+    
+    doc.add_paragraph(f"Ait Melloul le: {today.strftime('%d-%m-%Y')} ").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
+    doc.add_paragraph()
+    doc.add_paragraph(f"Le doyen").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
+    doc.add_page_break()
+
+def new_document():
     """
-    Generate DOCX document from schedule data.
+    Return an empty document with the letters' default font.
     """
     doc = Document()
     default_font = doc.styles['Normal'].font
     default_font.size = Pt(12)
     default_font.name = 'Arial'
+    return doc
 
-    for professor, info_list in schedule_data.items():
-        logo_paragraph = doc.add_paragraph()
-        logo_run = logo_paragraph.add_run()
-        logo_run.add_picture('endark.png', width=Inches(4))
-        logo_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        doc.add_paragraph()
-        doc.add_paragraph(f"A Mme/ Mr: {professor}")
-        doc.add_paragraph(f"Objet: Convocation aux surveillances des Examens")
-        doc.add_paragraph("Cher(e) collègue,")
-        doc.add_paragraph(f"Nous vous saurions gé de bien vouloir prendre toutes les dispositions nécessaires pour assurer la surveillance des épreuves écrites de la session {session} de {period} {au} aux jours et horaires indiqués ci-dessus:")
-        doc.add_paragraph()
-
-        table = doc.add_table(rows=1, cols=4)
-        table.style = 'Table Grid'
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Module'
-        hdr_cells[1].text = 'Date'
-        hdr_cells[2].text = 'Temps'
-        hdr_cells[3].text = 'Niveau'
-        #
-        for cell in hdr_cells:
-            for paragraph in cell.paragraphs:
-                for run in paragraph.runs:
-                    run.bold = True
-        #
-        table.allow_autofit = True  
-        for info in info_list:
-            subject = info['subject']
-            date = info['date']
-            time = info['time']
-            niveau = info['niveau']
-            row_cells = table.add_row().cells
-            row_cells[0].text = subject
-            row_cells[1].text = date
-            row_cells[2].text = time
-            row_cells[3].text = niveau
-        doc.add_paragraph()
-
-        doc.add_paragraph("Nous vous remercions de votre précieuse collaboration")
-        doc.add_paragraph()
-        doc.add_paragraph()
-        
-        doc.add_paragraph(f"Ait Melloul le: {today.strftime('%d-%m-%Y')} ").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
-        doc.add_paragraph()
-        doc.add_paragraph(f"Le doyen").alignment=WD_PARAGRAPH_ALIGNMENT.RIGHT
-        doc.add_page_break()
-
-    filename = f"invitations_profs_{today.strftime('%Y_%m_%d')}.docx"
-    doc.save(filename)
+def generate_docx(schedule_data, session, period, au, workers=1, chunk_size=None, split=False, progress=None, report=None,
+                  incremental_key=None, filename=None, archive=False):
+    """
+    Generate DOCX document from schedule data.
+    The letter is built once through python-docx, then cloned for every professor.
+    With workers > 1 the letters are rendered in chunks by a process pool.
+    filename is a path or a writable binary stream (e.g. a BytesIO) receiving the document.
+    With incremental_key, only the changed letters are rendered (into <filename>_changes.docx)
+    and spliced into the cached full document. With archive=True, filename receives a zip of
+    one .docx per professor.
+    """
+    # the slot strings are formatted once per workbook, rows in chronological order
+    letters = [(professor, schedule_data.display_rows(professor)) for professor in schedule_data]
+    layout = partial(add_letter, session=session, period=period, au=au)
+
+    if filename is None:
+        filename = f"invitations_profs_{today.strftime('%Y_%m_%d')}.docx"
+    if archive:
+        return [write_letter_archive(filename, new_document, layout, 4, 'endark.png', Inches(4), letters, progress, report)]
+    if incremental_key is not None:
+        changes_filename = f"{os.path.splitext(filename)[0]}_changes.docx" if isinstance(filename, str) else None
+        return write_letters_incremental(filename, new_document, layout, 4, 'endark.png', Inches(4), letters, incremental_key,
+                                         changes_filename, progress=progress, report=report)
+    return write_letters(filename, new_document, layout, 4, 'endark.png', Inches(4), letters, workers, chunk_size, split, progress, report)
 
 def upload_file():
     # Function to handle file upload
@@ -128,65 +171,157 @@ def create_invitations():
     session = session_var.get()
     period = period_var.get()
     au = au_entry.get()
+    incremental = incremental_var.get()
     if not file_path:
         messagebox.showerror("Error", "Please upload an Excel file.")
         return
-    process_excel(file_path, session, period, au)
-    messagebox.showinfo("Success", "Convocations created successfully!")
-    
-    # Prompt user to save the file
-    save_path = filedialog.asksaveasfilename(defaultextension=".docx", filetypes=[("Word Document", "*.docx")], title=f"invitations_profs_{today.strftime('%Y_%m_%d')}")
-    if save_path:
-        save_path = save_path.strip()
-        if save_path:
-            try:
-                import shutil
-                # Get the full path of the source file
-                source_file = f"invitations_profs_{today.strftime('%Y_%m_%d')}.docx"
-                # Move the file to the specified save path
-                shutil.move(source_file, save_path)
-                messagebox.showinfo("Success", f"File saved successfully at {save_path}.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error saving file: {e}")
-# Create main window
-root = tk.Tk()
-root.title("Covocation Creation")
-root.geometry("600x400")  # Set width x height
-
-# Heading
-heading_label = tk.Label(root, text="Convocation Creation", font=("Arial", 20))
-heading_label.pack(pady=10)
-
-# File Upload
+    # The document is written straight to its destination, no copy in the current directory
+    save_path = (filedialog.asksaveasfilename(
+        defaultextension=".docx", initialfile=f"invitations_profs_{today.strftime('%Y_%m_%d')}.docx",
+        filetypes=[("Word Document", "*.docx"), ("Zip, one document per professor", "*.zip")],
+    ) or "").strip()
+    if not save_path:
+        return
+    # The generation runs on a worker thread so the window stays responsive
+    cancel_event.clear()
+    progress_bar['value'] = 0
+    progress_label.config(text="Reading the schedule...")
+    submit_button.config(state=tk.DISABLED)
+    cancel_button.config(state=tk.NORMAL)
+    threading.Thread(target=run_generation, args=(file_path, session, period, au, incremental, save_path), daemon=True).start()
+    root.after(100, poll_generation)
+
+def cancel_invitations():
+    cancel_event.set()
+    progress_label.config(text="Cancelling...")
+
+def run_generation(file_path, session, period, au, incremental=False, save_path=None):
+    """
+    Worker thread: generate the convocations and report to the window through generation_events.
+    """
+    def progress(done, total):
+        if cancel_event.is_set():
+            raise Cancelled()
+        generation_events.put(('progress', done, total))
+
+    try:
+        import_pipeline()  # already done by the warm-up thread unless the user was quick
+        report = process_excel(file_path, session, period, au, progress=progress, incremental=incremental, filename=save_path)
+    except Cancelled:
+        generation_events.put(('cancelled',))
+    except Exception as e:
+        generation_events.put(('error', e))
+    else:
+        generation_events.put(('done', report, save_path))
+
+def poll_generation():
+    # Tk is not thread-safe: the worker's events are applied here, on the main loop
+    global last_report
+    while True:
+        try:
+            event = generation_events.get_nowait()
+        except queue.Empty:
+            root.after(100, poll_generation)
+            return
+        if event[0] == 'progress':
+            _, done, total = event
+            progress_bar['maximum'] = total
+            progress_bar['value'] = done
+            progress_label.config(text=f"{done} / {total} professors")
+            continue
+        submit_button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+        if event[0] == 'done':
+            last_report = event[1]
+            changed = next((record['changed'] for record in last_report.stages if record['stage'] == 'diff'), None)
+            progress_label.config(text="Done" if changed is None else f"Done, {changed} letter(s) changed")
+            report_button.config(state=tk.NORMAL)
+            conflicts = next((record['conflicts'] for record in last_report.stages if record['stage'] == 'checks'), 0)
+            messagebox.showinfo("Success", f"Convocations saved at {event[2]}."
+                                + (f"\n{conflicts} assignment(s) clash, see the Conflicts sheet of the checks." if conflicts else ""))
+        elif event[0] == 'cancelled':
+            progress_label.config(text="Cancelled")
+        else:
+            progress_label.config(text="Failed")
+            messagebox.showerror("Error", f"Error creating convocations: {event[1]}")
+        return
+
+def show_report():
+    # Stage by stage timings of the last generation, optionally saved as JSON
+    if last_report is None:
+        return
+    if messagebox.askyesno("Generation report", last_report.format() + "\n\nSave the report as JSON?"):
+        report_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")], title="generation_report")
+        if report_path:
+            last_report.save(report_path)
+
+# Selected from the window, module-level so the functions above stay importable
 file_path = None
-file_upload_button = tk.Button(root, text="Upload Excel File", command=upload_file)
-file_upload_button.pack(pady=5)
-
-# Dropdown for Session
-session_var = tk.StringVar(root)
-session_label = tk.Label(root, text="Session:")
-session_var.set("Normale")  # Set default value
-
-session_label.pack()
-session_dropdown = tk.OptionMenu(root, session_var, "Rattrappage", "Normale")
-session_dropdown.pack()
-
-# Dropdown for Period
-period_var = tk.StringVar(root)
-period_label = tk.Label(root, text="Period:")
-period_var.set("Automne")  # Set default value
-period_label.pack()
-period_dropdown = tk.OptionMenu(root, period_var, "Automne", "Printemps")
-period_dropdown.pack()
-
-# Text Entry for AU
-au_label = tk.Label(root, text="Année Universitaire (20XX/20YY):")
-au_label.pack()
-au_entry = tk.Entry(root)
-au_entry.pack()
-
-# Submit Button
-submit_button = tk.Button(root, text="Generate Convocations", command=create_invitations)
-submit_button.pack(pady=5)
-
-root.mainloop()
+# Worker thread -> main loop
+generation_events = queue.Queue()
+cancel_event = threading.Event()
+# PipelineReport of the last successful generation
+last_report = None
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # process pool workers in the frozen exe
+
+    # Create main window
+    root = tk.Tk()
+    root.title("Covocation Creation")
+    root.geometry("600x470")  # Set width x height
+
+    # Heading
+    heading_label = tk.Label(root, text="Convocation Creation", font=("Arial", 20))
+    heading_label.pack(pady=10)
+
+    # File Upload
+    file_upload_button = tk.Button(root, text="Upload Excel File", command=upload_file)
+    file_upload_button.pack(pady=5)
+
+    # Dropdown for Session
+    session_var = tk.StringVar(root)
+    session_label = tk.Label(root, text="Session:")
+    session_var.set("Normale")  # Set default value
+
+    session_label.pack()
+    session_dropdown = tk.OptionMenu(root, session_var, "Rattrappage", "Normale")
+    session_dropdown.pack()
+
+    # Dropdown for Period
+    period_var = tk.StringVar(root)
+    period_label = tk.Label(root, text="Period:")
+    period_var.set("Automne")  # Set default value
+    period_label.pack()
+    period_dropdown = tk.OptionMenu(root, period_var, "Automne", "Printemps")
+    period_dropdown.pack()
+
+    # Text Entry for AU
+    au_label = tk.Label(root, text="Année Universitaire (20XX/20YY):")
+    au_label.pack()
+    au_entry = tk.Entry(root)
+    au_entry.pack()
+
+    # Only re-render the letters changed since the last generation
+    incremental_var = tk.BooleanVar(root, value=False)
+    incremental_check = tk.Checkbutton(root, text="Only changed letters", variable=incremental_var)
+    incremental_check.pack()
+
+    # Submit Button
+    submit_button = tk.Button(root, text="Generate Convocations", command=create_invitations)
+    submit_button.pack(pady=5)
+
+    # Progress of the generation
+    progress_bar = ttk.Progressbar(root, orient="horizontal", length=300, mode="determinate")
+    progress_bar.pack(pady=5)
+    progress_label = tk.Label(root, text="")
+    progress_label.pack()
+    cancel_button = tk.Button(root, text="Cancel", command=cancel_invitations, state=tk.DISABLED)
+    cancel_button.pack(pady=5)
+    report_button = tk.Button(root, text="Show Report", command=show_report, state=tk.DISABLED)
+    report_button.pack(pady=5)
+
+    # the window is up: load the generation libraries while the user picks a file
+    threading.Thread(target=import_pipeline, daemon=True).start()
+
+    root.mainloop()
@@ -1,8 +1,28 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+#   pyinstaller index_gui_with_locals.spec              one-file exe
+#   pyinstaller index_gui_with_locals.spec -- --onedir  startup-optimized folder build
+#
+# The one-file exe unpacks itself into a temporary directory on every launch;
+# the --onedir build is run in place (and skips UPX, whose decompression also
+# costs at startup), so the window shows up at once.
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--onedir', action='store_true')
+options = parser.parse_args()
+
+# Never imported by the application, but pulled in by the analysis of pandas/numpy
+excludes = [
+    'pandas.tests', 'pandas.plotting._matplotlib', 'pandas.io.formats.style', 'pandas.io.clipboard',
+    'numpy.tests', 'numpy.f2py', 'numpy.distutils', 'numpy.random._examples',
+    'matplotlib', 'scipy', 'IPython', 'jinja2', 'pyarrow', 'numba', 'numexpr', 'bottleneck',
+    'sqlalchemy', 'tables', 'xlsxwriter', 'pytest', 'setuptools',
+]
 
 
 a = Analysis(
-    ['index_gui_with_locals.py'],
+    ['profs_convocations.py'],
     pathex=[],
     binaries=[],
     datas=[],
@@ -10,29 +30,57 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='index_gui_with_locals',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-    icon=['azaz.ico'],
-)
+if options.onedir:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='index_gui_with_locals',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+        icon=['azaz.ico'],
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        name='index_gui_with_locals',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='index_gui_with_locals',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+        icon=['azaz.ico'],
+    )
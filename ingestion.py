@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from extraction import DATE_ROW, NIVEAU_ROW, ROOM_MARK, STAR_MARK, SUBJECT_ROW, TIME_ROW, has_schedule_headers, merge_sheets
+from slot_catalog import SlotCatalog
+
+# Same layout as read_excel_file: 3 skipped rows, the department in the first
+# column (the index), then the professor column and one column per exam slot.
+SKIPPED_ROWS = 3
+HEADER_ROWS = 6
+INDEX_COLUMNS = 1
+
+
+def _is_missing(value):
+    return value is None or value == "" or (isinstance(value, float) and np.isnan(value))
+
+
+def _is_marked(value, mark):
+    if mark == STAR_MARK:
+        return value == "*"
+    return isinstance(value, str) and value[-1:].isdigit()
+
+
+def _ffill(values):
+    last = np.nan
+    filled = []
+    for value in values:
+        if not _is_missing(value):
+            last = value
+        filled.append(last)
+    return filled
+
+
+def _stream_sheet(sheet, mark, check_layout=True):
+    """
+    Return the assignments frame, SlotCatalog and professor roster of one
+    read-only worksheet, or None when check_layout is set and its headers are not a schedule's
+    (the rest of the sheet is then not read).
+    """
+    sheet.reset_dimensions()
+
+    headers = []
+    professors, slots, locals_ = [], [], []
+    roster = {}
+    last_professor = None
+    width = 0
+    for row_number, row in enumerate(sheet.iter_rows(values_only=True)):
+        # pandas pads the frame to the last filled cell of any row
+        for last in range(len(row) - 1, -1, -1):
+            if not _is_missing(row[last]):
+                width = max(width, last + 1 - INDEX_COLUMNS)
+                break
+        if row_number < SKIPPED_ROWS:
+            continue
+        row = row[INDEX_COLUMNS:]
+        position = row_number - SKIPPED_ROWS
+        if position < HEADER_ROWS:
+            headers.append(list(row))
+            if position == HEADER_ROWS - 1 and check_layout and not has_schedule_headers(headers[DATE_ROW], headers[TIME_ROW]):
+                return None
+            continue
+
+        professor = row[0] if row else None
+        # pretreatment forward-fills the professor column from the second professor row on
+        if position > HEADER_ROWS:
+            if _is_missing(professor):
+                professor = last_professor
+            else:
+                last_professor = professor
+        if _is_missing(professor):
+            professor = np.nan
+        else:
+            roster[professor] = None
+
+        start = 0 if mark == STAR_MARK else 1
+        for column in range(start, len(row)):
+            value = row[column]
+            if not _is_missing(value) and _is_marked(value, mark):
+                professors.append(professor)
+                slots.append(column)
+                locals_.append(value)
+    if check_layout and len(headers) < HEADER_ROWS:
+        return None
+
+    slots = np.asarray(slots, dtype=np.int64)
+    keep = np.ones(len(slots), dtype=bool)
+    if mark == ROOM_MARK:
+        # the two trailing total columns are never rooms
+        keep = slots < width - 2
+
+    header_values = []
+    for header_row in (DATE_ROW, TIME_ROW, NIVEAU_ROW, SUBJECT_ROW):
+        values = headers[header_row] if header_row < len(headers) else []
+        values = [np.nan if _is_missing(value) else value for value in values]
+        values += [np.nan] * (width - len(values))
+        if header_row in (DATE_ROW, TIME_ROW):
+            values = _ffill(values)
+        header_values.append(np.asarray(values, dtype=object))
+    dates, times, niveaux, subjects = header_values
+
+    assignments = pd.DataFrame({
+        'professor': np.asarray(professors, dtype=object)[keep],
+        'slot': slots[keep],
+    })
+    if mark == ROOM_MARK:
+        assignments['local'] = np.asarray(locals_, dtype=object)[keep]
+    return assignments, SlotCatalog(subjects, dates, times, niveaux), list(roster)
+
+
+def stream_assignments(file_path, mark=STAR_MARK, skipped=None):
+    """
+    Read the assignments straight from the workbook, row by row.
+
+    The workbook is opened read-only, once, and every sheet laid out as a
+    schedule is read in turn (the first sheet alone when none is). Only the
+    slot header rows, the professor of each row and its marked cells are
+    kept, so memory grows with the number of assignments rather than with
+    the size of the sheets. Returns the same frame, SlotCatalog and roster as
+    extraction.merge_sheets on the sheets of read_schedule_sheets. The names
+    of the sheets not read as schedules are appended to skipped, a list.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheets, others = [], []
+        for sheet in workbook.worksheets:
+            extracted = _stream_sheet(sheet, mark)
+            if extracted is not None:
+                sheets.append((sheet.title, *extracted))
+            else:
+                others.append(sheet.title)
+        if not sheets:
+            sheets.append((workbook.worksheets[0].title, *_stream_sheet(workbook.worksheets[0], mark, check_layout=False)))
+            others = others[1:]
+    finally:
+        workbook.close()
+    if skipped is not None:
+        skipped.extend(others)
+    return merge_sheets(sheets)
+
+
+def read_schedule_sheets(file_path, skipped=None):
+    """
+    Read the sheets of the workbook laid out as schedules (departments,
+    filières), opening it once. Returns {sheet name: raw_data_df}, each frame
+    read as index.read_excel_file reads the first sheet; the first sheet alone
+    when none has readable dates and times. The names of the other sheets are
+    appended to skipped, a list.
+    """
+    options = {'skiprows': SKIPPED_ROWS, 'header': None, 'index_col': [0]}
+    sheets, others = {}, []
+    with pd.ExcelFile(file_path, engine='openpyxl') as workbook:
+        for name in workbook.sheet_names:
+            # the header rows tell a schedule from the other sheets, which are not read further
+            headers = [row[INDEX_COLUMNS:] for row in workbook.book[name].iter_rows(
+                min_row=SKIPPED_ROWS + 1, max_row=SKIPPED_ROWS + HEADER_ROWS, values_only=True)]
+            if len(headers) > TIME_ROW and has_schedule_headers(headers[DATE_ROW], headers[TIME_ROW]):
+                sheets[name] = workbook.parse(name, **options)
+            else:
+                others.append(name)
+        if not sheets:
+            name = workbook.sheet_names[0]
+            sheets[name] = workbook.parse(name, **options)
+            others = others[1:]
+    if skipped is not None:
+        skipped.extend(others)
+    return sheets
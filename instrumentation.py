@@ -0,0 +1,117 @@
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of the process so far in MB, or None if unknown.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1e6
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+class PipelineReport:
+    """
+    Timings, memory and counts of one run of the pipeline, stage by stage.
+
+    Every stage records its wall and CPU time, the peak RSS of the process at
+    its end and, with trace_memory=True, the tracemalloc growth and peak
+    during the stage. Counts (rows, assignments, letters...) are added by the
+    code inside the stage. With profile_path set, the stages opened with
+    profile=True run under cProfile and their stats are dumped there.
+    """
+
+    def __init__(self, trace_memory=False, profile_path=None):
+        self.trace_memory = trace_memory
+        self.profile_path = profile_path
+        self.stages = []
+        self._depth = 0
+        self._owns_tracing = False
+
+    @contextmanager
+    def stage(self, name, profile=False):
+        record = {'stage': name, 'depth': self._depth}
+        self.stages.append(record)
+        tracing = self.trace_memory
+        if tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        if tracing:
+            if self._depth == 0:
+                tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        profiler = cProfile.Profile() if profile and self.profile_path else None
+
+        self._depth += 1
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path)
+                record['profile'] = self.profile_path
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            self._depth -= 1
+            record['peak_rss_mb'] = peak_rss_mb()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                record['traced_delta_mb'] = (current - traced_start) / 1e6
+                record['traced_peak_mb'] = peak / 1e6
+            if self._owns_tracing and self._depth == 0:
+                tracemalloc.stop()
+                self._owns_tracing = False
+
+    def as_dict(self):
+        return {'stages': self.stages}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(self.as_dict(), report_file, indent=2, default=str)
+
+    def format(self):
+        """
+        Return the report as a text table.
+        """
+        fixed = ('stage', 'depth', 'wall_s', 'cpu_s', 'peak_rss_mb', 'traced_delta_mb', 'traced_peak_mb', 'profile')
+        lines = [f"{'stage':<22} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'traced MB':>10}  counts"]
+        for record in self.stages:
+            name = '  ' * record['depth'] + record['stage']
+            rss = record.get('peak_rss_mb')
+            traced = record.get('traced_delta_mb')
+            counts = ', '.join(f"{key}={value}" for key, value in record.items() if key not in fixed)
+            lines.append(
+                f"{name:<22} {record.get('wall_s', 0):>8.3f} {record.get('cpu_s', 0):>8.3f} "
+                f"{'-' if rss is None else f'{rss:.1f}':>8} {'-' if traced is None else f'{traced:.1f}':>10}  {counts}"
+            )
+        return '\n'.join(lines)
+
+
+@contextmanager
+def stage(report, name, profile=False):
+    """
+    report.stage(name) when a report is being collected, otherwise a no-op.
+    Yields the record counts can be added to.
+    """
+    if report is None:
+        yield {}
+        return
+    with report.stage(name, profile) as record:
+        yield record
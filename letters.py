@@ -0,0 +1,441 @@
+import hashlib
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+from functools import partial
+
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
+from lxml import etree
+
+from instrumentation import stage
+
+
+class Logo:
+    """
+    Logo image registered once in a document and referenced by every letter.
+
+    run.add_picture re-reads and re-hashes the image and rescans the whole
+    document for the next shape id on every call; here the image part, its
+    relationship and its scaled size are resolved once.
+    """
+
+    def __init__(self, document, logo_path, width=None, height=None):
+        self.part = document.part
+        self.rId, image = self.part.get_or_add_image(logo_path)
+        self.filename = image.filename
+        self.blob = image.blob
+        self.cx, self.cy = image.scaled_dimensions(width, height)
+        self._next_shape_id = self.part.next_id
+
+    def add_to(self, run):
+        """
+        Add the logo at the end of run.
+        """
+        inline = CT_Inline.new_pic_inline(self._next_shape_id, self.rId, self.filename, self.cx, self.cy)
+        self._next_shape_id += 1
+        run._r.add_drawing(inline)
+
+
+PROFESSOR_PLACEHOLDER = '{professor}'
+
+
+def _runs_with(element, placeholder):
+    return [t.getparent() for t in element.iter(qn('w:t')) if t.text and placeholder in t.text]
+
+
+class LetterTemplate:
+    """
+    A letter built once through python-docx and then cloned at the lxml level.
+
+    build_letter(professor, rows) must append one letter to doc, with one
+    table whose data rows hold one run per cell. It is called once with
+    PROFESSOR_PLACEHOLDER and a single placeholder row; the resulting body
+    elements become the template and are removed from the document. render
+    then deep-copies them for each professor, substitutes the professor's name
+    and clones the placeholder row once per assignment.
+    """
+
+    ROW_PLACEHOLDER = '{cell}'
+
+    def __init__(self, doc, build_letter, columns):
+        self.body = doc.element.body
+        self.sectPr = self.body.sectPr
+        start = len(self.body) - (1 if self.sectPr is not None else 0)
+        # the template leaves the document, its shape ids are handed out again to the clones
+        self._next_shape_id = doc.part.next_id
+        build_letter(PROFESSOR_PLACEHOLDER, [[self.ROW_PLACEHOLDER] * columns])
+        self.elements = [element for element in self.body[start:] if element is not self.sectPr]
+        for element in self.elements:
+            self.body.remove(element)
+
+        self.table_position = next(i for i, element in enumerate(self.elements) if element.tag == qn('w:tbl'))
+        table = self.elements[self.table_position]
+        self.row = table.findall(qn('w:tr'))[-1]
+        table.remove(self.row)
+
+    def _fill_row(self, values):
+        row = deepcopy(self.row)
+        for run, value in zip(_runs_with(row, self.ROW_PLACEHOLDER), values):
+            run.text = value
+        return row
+
+    def render(self, professor, rows):
+        """
+        Append the letter of professor, with one table row per list of cell strings in rows.
+        """
+        professor = str(professor)
+        for position, template in enumerate(self.elements):
+            element = deepcopy(template)
+            for run in _runs_with(element, PROFESSOR_PLACEHOLDER):
+                run.text = run.text.replace(PROFESSOR_PLACEHOLDER, professor)
+            for doc_pr in element.iter(qn('wp:docPr')):
+                doc_pr.set('id', str(self._next_shape_id))
+                doc_pr.set('name', f'Picture {self._next_shape_id}')
+                self._next_shape_id += 1
+            if position == self.table_position:
+                for values in rows:
+                    element.append(self._fill_row(values))
+            if self.sectPr is not None:
+                self.sectPr.addprevious(element)
+            else:
+                self.body.append(element)
+
+
+class Cancelled(Exception):
+    """
+    Raised by a progress callback to stop the generation.
+    """
+
+
+def render_document(new_document, add_letter, columns, logo_path, logo_width, letters, progress=None):
+    """
+    Return a new document holding one letter per (professor, rows) of letters.
+
+    add_letter(doc, logo, professor, rows) lays out one letter with python-docx;
+    it is used once to build the LetterTemplate. progress(done, total) is called
+    after each letter.
+    """
+    doc = new_document()
+    if letters:
+        logo = Logo(doc, logo_path, width=logo_width)
+        template = LetterTemplate(doc, lambda professor, rows: add_letter(doc, logo, professor, rows), columns)
+        for done, (professor, rows) in enumerate(letters, start=1):
+            template.render(professor, rows)
+            if progress is not None:
+                progress(done, len(letters))
+    return doc
+
+
+class LetterRenderer:
+    """
+    The document, Logo and LetterTemplate of render_document, prepared once
+    and reused by every document with the same layout, for a process that
+    generates many (service.py). logo_digest is the sha256 of the logo, as
+    schedule_cache.workbook_hash of logo_path would give it.
+
+    The document returned by render is the renderer's own: it is only valid
+    until the next render, and a renderer serves one thread at a time.
+    """
+
+    def __init__(self, new_document, add_letter, columns, logo_path, logo_width):
+        self.new_document = new_document
+        self.doc = new_document()
+        self.logo = Logo(self.doc, logo_path, width=logo_width)
+        self.logo_digest = hashlib.sha256(self.logo.blob).hexdigest()
+        self.template = LetterTemplate(self.doc, lambda professor, rows: add_letter(self.doc, self.logo, professor, rows), columns)
+        self._first_shape_id = self.template._next_shape_id
+
+    def render(self, letters, progress=None):
+        """
+        Return the document holding one letter per (professor, rows) of
+        letters, as render_document does.
+        """
+        if not letters:
+            return self.new_document()
+        body = self.doc.element.body
+        # the letters of the previous render, unless they were moved to another document
+        for element in [element for element in body if element is not self.template.sectPr]:
+            body.remove(element)
+        self.template._next_shape_id = self._first_shape_id
+        for done, (professor, rows) in enumerate(letters, start=1):
+            self.template.render(professor, rows)
+            if progress is not None:
+                progress(done, len(letters))
+        return self.doc
+
+
+def _render_chunk(new_document, add_letter, columns, logo_path, logo_width, letters, filename):
+    """
+    Worker side of write_letters: save the chunk to filename, or return its body
+    elements as XML when filename is None.
+    """
+    doc = render_document(new_document, add_letter, columns, logo_path, logo_width, letters)
+    if filename is not None:
+        doc.save(filename)
+        return filename
+    body = doc.element.body
+    if body.sectPr is not None:
+        body.remove(body.sectPr)
+    return etree.tostring(body)
+
+
+def _append_body(doc, logo, body_xml, next_shape_id):
+    """
+    Append the letters of a chunk rendered by another process to doc.
+    The logo relationship and the shape ids are remapped to doc's own.
+    """
+    sectPr = doc.element.body.sectPr
+    for element in list(parse_xml(body_xml)):
+        next_shape_id = _adopt(element, logo, next_shape_id)
+        sectPr.addprevious(element)
+    return next_shape_id
+
+
+def _adopt(element, logo, next_shape_id):
+    """
+    Point the pictures of element, coming from another document, at logo and
+    give them shape ids from next_shape_id on. Returns the next free id.
+    """
+    for blip in element.iter(qn('a:blip')):
+        blip.set(qn('r:embed'), logo.rId)
+    for doc_pr in element.iter(qn('wp:docPr')):
+        doc_pr.set('id', str(next_shape_id))
+        doc_pr.set('name', f'Picture {next_shape_id}')
+        next_shape_id += 1
+    return next_shape_id
+
+
+def chunked(letters, chunk_size):
+    return [letters[start:start + chunk_size] for start in range(0, len(letters), chunk_size)]
+
+
+def _write_package(target, new_document, add_letter, columns, logo_path, logo_width, letters, batch_size, progress, record):
+    doc = new_document()
+    if not letters:
+        doc.save(target)
+        return
+    logo = Logo(doc, logo_path, width=logo_width)
+    template = LetterTemplate(doc, lambda professor, rows: add_letter(doc, logo, professor, rows), columns)
+    body = doc.element.body
+    # the letters are rendered after the marker, whose serialization cuts the main part in two
+    marker = etree.Comment('letters')
+    if template.sectPr is not None:
+        template.sectPr.addprevious(marker)
+    else:
+        body.append(marker)
+    empty = serialize_part_xml(doc.element)
+    marker_xml = etree.tostring(marker)
+    head, tail = empty.split(marker_xml)
+
+    skeleton = io.BytesIO()
+    doc.save(skeleton)
+    document_part = doc.part.partname.membername
+    with zipfile.ZipFile(skeleton) as source, zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as package:
+        for info in source.infolist():
+            if info.filename != document_part:
+                package.writestr(info, source.read(info))
+                continue
+            streamed = zipfile.ZipInfo(info.filename, info.date_time)
+            streamed.compress_type = zipfile.ZIP_DEFLATED
+            with package.open(streamed, 'w') as part:
+                part.write(head)
+                done = 0
+                for batch in chunked(letters, batch_size):
+                    for professor, rows in batch:
+                        template.render(professor, rows)
+                    xml = serialize_part_xml(doc.element)
+                    part.write(xml[len(head) + len(marker_xml):len(xml) - len(tail)])
+                    # only the letters of one batch are ever held as elements
+                    for element in [element for element in body if element is not marker and element is not template.sectPr]:
+                        body.remove(element)
+                    done += len(batch)
+                    record['batches'] += 1
+                    if progress is not None:
+                        progress(done, len(letters))
+                part.write(tail)
+
+
+def write_letters_streaming(target, new_document, add_letter, columns, logo_path, logo_width, letters,
+                            batch_size=200, progress=None, report=None):
+    """
+    Render the letters batch_size at a time and write them into the .docx
+    target as they go, so that memory does not grow with the number of letters.
+
+    Only the main document part changes with the letters: the other parts of
+    the package are written once, and the body is streamed into it one
+    serialized batch after the other. target is a path, written under a
+    temporary name and renamed once complete, or a writable binary stream.
+    progress(done, total) is called after each batch and may raise Cancelled.
+    Returns target.
+    """
+    with stage(report, 'render', profile=True) as record:
+        record['letters'] = len(letters)
+        record['batches'] = 0
+        if not isinstance(target, (str, os.PathLike)):
+            _write_package(target, new_document, add_letter, columns, logo_path, logo_width, letters, batch_size, progress, record)
+            return target
+        partial_path = f"{os.fspath(target)}.part"
+        try:
+            _write_package(partial_path, new_document, add_letter, columns, logo_path, logo_width, letters, batch_size, progress, record)
+            os.replace(partial_path, target)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+    return target
+
+
+def write_letters(filename, new_document, add_letter, columns, logo_path, logo_width, letters,
+                  workers=1, chunk_size=None, split=False, progress=None, report=None, batch_size=None, renderer=None):
+    """
+    Render the letters and save them to filename, using up to workers processes.
+
+    The letters are cut into chunks of chunk_size professors (by default one
+    chunk per worker) rendered in a ProcessPoolExecutor. With split=False the
+    chunks are merged at the XML body level into filename; with split=True each
+    chunk is saved on its own as <filename>_<chunk>.docx (chunk_size=1 gives one
+    file per professor). Professor order is preserved. Returns the saved paths.
+    Except with split=True, filename may also be a writable binary stream
+    (an open file, a BytesIO...), which receives the document directly.
+
+    With batch_size, the letters are instead rendered in a single process and
+    streamed into filename batch_size at a time (write_letters_streaming):
+    memory stays flat whatever the number of professors.
+
+    progress(done, total) is called as letters (or whole chunks) are rendered;
+    it may raise Cancelled to stop before anything is saved. The render and
+    save stages are recorded in report, an instrumentation.PipelineReport.
+    A LetterRenderer prepared for this layout renders the letters of a single
+    process, single document run in place of a new document and template.
+    """
+    if batch_size:
+        if split or workers > 1:
+            raise ValueError("batch_size streams a single document from a single process, without split or workers")
+        return [write_letters_streaming(filename, new_document, add_letter, columns, logo_path, logo_width, letters,
+                                        batch_size, progress, report)]
+    if workers <= 1 and not split:
+        with stage(report, 'render', profile=True) as record:
+            record['letters'] = len(letters)
+            if renderer is not None:
+                doc = renderer.render(letters, progress)
+            else:
+                doc = render_document(new_document, add_letter, columns, logo_path, logo_width, letters, progress)
+        with stage(report, 'save'):
+            doc.save(filename)
+        return [filename]
+
+    if split and not isinstance(filename, (str, os.PathLike)):
+        raise ValueError("split=True saves several files and needs a file name, not a stream")
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(letters) // max(workers, 1)))
+    chunks = chunked(letters, chunk_size)
+    stem = os.path.splitext(filename)[0] if split else None
+    filenames = [f"{stem}_{number:03d}.docx" if split else None for number in range(1, len(chunks) + 1)]
+
+    # Inches/Cm do not survive pickling (they would be scaled again), send plain EMUs
+    logo_width = None if logo_width is None else int(logo_width)
+    render_chunk = partial(_render_chunk, new_document, add_letter, columns, logo_path, logo_width)
+    results = [None] * len(chunks)
+    done = 0
+    with stage(report, 'render', profile=True) as record:
+        record['letters'] = len(letters)
+        record['chunks'] = len(chunks)
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            try:
+                futures = {executor.submit(render_chunk, chunk, name): number for number, (chunk, name) in enumerate(zip(chunks, filenames))}
+                for future in as_completed(futures):
+                    number = futures[future]
+                    results[number] = future.result()
+                    done += len(chunks[number])
+                    if progress is not None:
+                        progress(done, len(letters))
+            finally:
+                executor.shutdown(cancel_futures=True)
+        else:
+            for number, (chunk, name) in enumerate(zip(chunks, filenames)):
+                results[number] = render_chunk(chunk, name)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, len(letters))
+    if split:
+        return results
+
+    with stage(report, 'merge'):
+        doc = new_document()
+        if letters:
+            logo = Logo(doc, logo_path, width=logo_width)
+            next_shape_id = doc.part.next_id
+            for body_xml in results:
+                next_shape_id = _append_body(doc, logo, body_xml, next_shape_id)
+    with stage(report, 'save'):
+        doc.save(filename)
+    return [filename]
+
+
+def letter_filename(number, professor):
+    """
+    Name of the .docx of one professor inside an archive, numbered to keep the order.
+    """
+    name = re.sub(r'[^\w\- .]+', '_', str(professor)).strip(' ._') or 'professor'
+    return f"{number:04d}_{name}.docx"
+
+
+def iter_letter_documents(new_document, add_letter, columns, logo_path, logo_width, letters):
+    """
+    Yield (professor, docx bytes) with one document of its own per letter.
+
+    A single document holds the letter being produced: each one is rendered,
+    packaged in memory, then removed from the document before the next one.
+    Only the main document part differs between the letters; the other parts
+    of the package (styles, logo...) are serialized once.
+    """
+    if not letters:
+        return
+    doc = new_document()
+    logo = Logo(doc, logo_path, width=logo_width)
+    template = LetterTemplate(doc, lambda professor, rows: add_letter(doc, logo, professor, rows), columns)
+    skeleton = io.BytesIO()
+    doc.save(skeleton)
+    with zipfile.ZipFile(skeleton) as package:
+        parts = [(info, package.read(info)) for info in package.infolist()]
+    document_part = doc.part.partname.membername
+    body = doc.element.body
+    first_shape_id = template._next_shape_id
+    for professor, rows in letters:
+        # every letter is a document of its own, with the ids of a single letter
+        template._next_shape_id = first_shape_id
+        template.render(professor, rows)
+        letter = io.BytesIO()
+        with zipfile.ZipFile(letter, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as package:
+            for info, data in parts:
+                if info.filename == document_part:
+                    data = serialize_part_xml(doc.element)
+                package.writestr(info.filename, data, info.compress_type)
+        for element in [element for element in body if element is not template.sectPr]:
+            body.remove(element)
+        yield professor, letter.getvalue()
+
+
+def write_letter_archive(target, new_document, add_letter, columns, logo_path, logo_width, letters,
+                         progress=None, report=None):
+    """
+    Write one .docx per professor into the zip archive target, a path or a
+    writable binary stream. Each letter is added as soon as it is rendered,
+    nothing is staged on disk. Returns target.
+    """
+    with stage(report, 'archive', profile=True) as record:
+        record['letters'] = len(letters)
+        # the .docx files are zip files already, compressing them again gains nothing
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_STORED) as archive:
+            documents = iter_letter_documents(new_document, add_letter, columns, logo_path, logo_width, letters)
+            for done, (professor, data) in enumerate(documents, start=1):
+                archive.writestr(letter_filename(done, professor), data)
+                if progress is not None:
+                    progress(done, len(letters))
+    return target
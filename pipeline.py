@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from diagnostics import dump_frame
+from extraction import STAR_MARK, extract_assignments, extract_slot_catalog, merge_sheets, professor_roster
+from ingestion import read_schedule_sheets, stream_assignments
+from instrumentation import stage
+from schedule_cache import cached_schedule
+from schedule_table import ScheduleTable
+
+
+def pretreatment(raw_data_df):
+    """
+    Perform pretreatment on the DataFrame.
+    """
+    raw_data_df.iloc[7:, 0] = raw_data_df.iloc[7:, 0].ffill()
+    raw_data_df.iloc[0, :] = raw_data_df.iloc[0, :].ffill()
+    raw_data_df.iloc[1, :] = raw_data_df.iloc[1, :].ffill()
+    return raw_data_df.iloc[6:,:]
+
+
+def extract_sheet(raw_data_df, mark=STAR_MARK):
+    """
+    Pretreat one sheet and return its pretreated frame, assignments, SlotCatalog and professor roster.
+    """
+    processed_data_df = pretreatment(raw_data_df)
+    return (processed_data_df, extract_assignments(raw_data_df, processed_data_df, mark=mark), extract_slot_catalog(raw_data_df),
+            professor_roster(processed_data_df))
+
+
+def load_schedule_data(file_path, mark=STAR_MARK, streaming=False, debug_dump=None, report=None):
+    """
+    Parse the Excel file into the professors' schedules, mark telling the
+    marked cells (extraction.STAR_MARK or ROOM_MARK).
+    With streaming=True the workbook is read row by row instead of loaded whole.
+    The sheets not laid out as schedules are left out, their names recorded
+    under skipped_sheets in the read stage of report.
+    debug_dump is a directory receiving the intermediate frames as CSV (off by default).
+    """
+    skipped = []
+    if streaming:
+        # read the workbook row by row, keeping only the marked cells
+        with stage(report, 'stream_excel') as record:
+            assignments, catalog, roster = stream_assignments(file_path, mark=mark, skipped=skipped)
+            record['sheets'] = len(set(catalog.sheets))
+            record['skipped_sheets'] = skipped
+    else:
+        with stage(report, 'read_excel') as record:
+            # every department sheet, the workbook being opened once
+            sheets = read_schedule_sheets(file_path, skipped)
+            record['sheets'] = len(sheets)
+            record['skipped_sheets'] = skipped
+            record['rows'] = sum(len(raw_data_df) for raw_data_df in sheets.values())
+        names = {name: name if len(sheets) > 1 else None for name in sheets}
+        for name, raw_data_df in sheets.items():
+            dump_frame(raw_data_df, debug_dump, file_path, "raw", names[name])
+        with stage(report, 'extraction') as record:
+            # the sheets are independent: pretreat and extract them concurrently
+            with ThreadPoolExecutor(max_workers=min(len(sheets), os.cpu_count() or 1)) as executor:
+                extracted = list(executor.map(lambda raw_data_df: extract_sheet(raw_data_df, mark), sheets.values()))
+            for name, (processed_data_df, *_) in zip(sheets, extracted):
+                dump_frame(processed_data_df, debug_dump, file_path, "pretreated", names[name])
+            assignments, catalog, roster = merge_sheets([(name, *sheet) for name, (_, *sheet) in zip(sheets, extracted)])
+    record['assignments'] = len(assignments)
+    dump_frame(assignments, debug_dump, file_path, "assignments")
+    dump_frame(catalog.to_frame(), debug_dump, file_path, "slots")
+    return ScheduleTable.from_assignments(assignments, catalog, roster)
+
+
+def load_schedule(file_path, mark=STAR_MARK, streaming=False, use_cache=True, debug_dump=None, report=None):
+    """
+    The load stage of the command line and the GUIs: return the schedule of
+    file_path, parsed by load_schedule_data unless the same workbook content
+    was already parsed (schedule_cache). Debug dumps always parse.
+    """
+    with stage(report, 'load') as record:
+        if use_cache and not debug_dump:
+            schedule_data = cached_schedule(file_path, mark, lambda: load_schedule_data(file_path, mark, streaming, report=report))
+        else:
+            schedule_data = load_schedule_data(file_path, mark, streaming, debug_dump, report)
+        record['professors'] = len(schedule_data)
+    return schedule_data
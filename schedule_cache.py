@@ -0,0 +1,75 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump whenever the parsing or the ScheduleTable layout changes, so that
+# schedules parsed by an older version are not reused.
+PARSER_VERSION = 6
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'profs_convocations')
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+# parsed schedules, and the documents of incremental.py with their manifests
+CACHE_SUFFIXES = ('.pickle', '.docx', '.json')
+
+
+def workbook_hash(file_path, chunk_size=1024 * 1024):
+    """
+    Return the sha256 of the workbook content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as workbook:
+        for chunk in iter(lambda: workbook.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(file_path, mark, cache_dir=CACHE_DIR, digest=None):
+    if digest is None:
+        digest = workbook_hash(file_path)
+    return os.path.join(cache_dir, f"{digest}-{mark}-v{PARSER_VERSION}.pickle")
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Remove the least recently used entries until the cache fits in max_bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_SUFFIXES):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached_schedule(file_path, mark, parse, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, digest=None):
+    """
+    Return the parsed schedule of file_path, calling parse() only when the
+    workbook content (or the parser version) has not been seen before.
+    digest is the workbook_hash of file_path when the caller already has it.
+    """
+    path = cache_path(file_path, mark, cache_dir, digest)
+    try:
+        with open(path, 'rb') as entry:
+            schedule_data = pickle.load(entry)
+        os.utime(path)  # mark as recently used
+        return schedule_data
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    schedule_data = parse()
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as entry:
+        pickle.dump(schedule_data, entry, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes)
+    return schedule_data
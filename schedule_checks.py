@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+def _slot_column(table, position):
+    return np.array([slot[position] for slot in table.slots], dtype=object)
+
+
+def find_conflicts(table):
+    """
+    Return the assignments of professors booked in two slots of the same
+    period, one row per clashing assignment, grouped per professor.
+    """
+    periods = table.period_codes
+    keys = table.professor_codes.astype(np.int64) * max(len(table.periods), 1) + periods
+    clashing = np.nonzero(pd.Series(keys).duplicated(keep=False).to_numpy())[0]
+    clashing = clashing[np.lexsort((periods[clashing], table.professor_codes[clashing]))]
+
+    slot_codes = table.slot_codes[clashing]
+    conflicts = pd.DataFrame({
+        'professor': np.array(table.professors, dtype=object)[table.professor_codes[clashing]],
+        'date': _slot_column(table, 1)[slot_codes],
+        'time': _slot_column(table, 2)[slot_codes],
+        'subject': _slot_column(table, 0)[slot_codes],
+        'niveau': _slot_column(table, 3)[slot_codes],
+    })
+    if len(set(table.catalog.sheets)) > 1:
+        # the two slots may come from different departments
+        conflicts.insert(1, 'sheet', np.array(table.catalog.sheets, dtype=object)[slot_codes])
+    if table.rooms is not None:
+        conflicts['local'] = np.array(table.rooms, dtype=object)[table.room_codes[clashing]]
+    return conflicts
+
+
+def professor_load(table):
+    """
+    Return the invigilation load of every professor: assignments, distinct
+    periods and days, and the difference with the average number of assignments.
+    The professors of the sheets without any assignment are listed last, with
+    a load of zero, and count in the average.
+    """
+    professors = len(table.professors)
+    assignments = np.bincount(table.professor_codes, minlength=professors)
+
+    periods = pd.DataFrame({'professor': table.professor_codes, 'period': table.period_codes}).drop_duplicates()
+    day_codes, _ = pd.factorize(pd.Series([day for day, _ in table.period_keys], dtype=object), use_na_sentinel=False)
+    days = pd.DataFrame({'professor': periods['professor'], 'day': day_codes[periods['period']]}).drop_duplicates()
+
+    idle = np.zeros(len(table.unassigned), dtype=np.int64)
+    load = pd.DataFrame({
+        'professor': table.professors + table.unassigned,
+        'assignments': np.concatenate([assignments, idle]),
+        'periods': np.concatenate([np.bincount(periods['professor'], minlength=professors), idle]),
+        'days': np.concatenate([np.bincount(days['professor'], minlength=professors), idle]),
+    })
+    load['vs_average'] = (load['assignments'] - load['assignments'].mean()).round(2)
+    return load
+
+
+def room_occupancy(table):
+    """
+    Return, for every room, the periods and slots it is used in and the
+    number of invigilators assigned to it. None without rooms.
+    """
+    if table.rooms is None:
+        return None
+    rooms = len(table.rooms)
+    used = pd.DataFrame({'room': table.room_codes, 'slot': table.slot_codes, 'period': table.period_codes})
+    return pd.DataFrame({
+        'local': table.rooms,
+        'periods': np.bincount(used[['room', 'period']].drop_duplicates()['room'], minlength=rooms),
+        'slots': np.bincount(used[['room', 'slot']].drop_duplicates()['room'], minlength=rooms),
+        'invigilators': np.bincount(table.room_codes, minlength=rooms),
+    })
+
+
+def write_schedule_checks(table, path):
+    """
+    Write the conflicts, the professors' load and the rooms' occupancy as the
+    sheets of an Excel workbook. Returns the number of clashing assignments.
+    """
+    conflicts = find_conflicts(table)
+    occupancy = room_occupancy(table)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        conflicts.to_excel(writer, sheet_name='Conflicts', index=False)
+        professor_load(table).to_excel(writer, sheet_name='Load', index=False)
+        if occupancy is not None:
+            occupancy.to_excel(writer, sheet_name='Rooms', index=False)
+    return len(conflicts)
@@ -0,0 +1,167 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from slot_catalog import period_key
+
+SLOT_FIELDS = ('subject', 'date', 'time', 'niveau')
+
+
+def _offsets(codes, size):
+    """
+    Return the stable order of the codes and the start offset of each code in it.
+    """
+    order = np.argsort(codes, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=size), out=offsets[1:])
+    return order, offsets
+
+
+class ScheduleTable(Mapping):
+    """
+    Columnar store of the professors' assignments.
+
+    Professors and rooms are kept once each, the slots (exam columns of the
+    sheet) in a SlotCatalog; every assignment is a row of integer codes into
+    them, its slot code being the column. It behaves as the
+    {professor: [schedule_info, ...]} dict the rest of the scripts expect, the
+    schedule_info dicts being built on access.
+
+    The assignments are indexed by professor, slot and room, and the slots
+    by period: the (date, time) they take place at, shared by the exams held
+    simultaneously, even on different sheets (slot_catalog.period_key).
+    periods holds the (date, time) of each as first printed, period_keys
+    their keys.
+
+    The professors are those with at least one assignment, who get a letter;
+    unassigned lists the others found on the sheets, for the load checks.
+    """
+
+    def __init__(self, professors, catalog, rooms, professor_codes, slot_codes, room_codes=None, unassigned=()):
+        self.professors = list(professors)
+        self.unassigned = list(unassigned)
+        self.catalog = catalog
+        self.slots = [catalog.fields(column) for column in range(len(catalog))]
+        self.rooms = None if rooms is None else list(rooms)
+        self.professor_codes = np.asarray(professor_codes, dtype=np.int32)
+        self.slot_codes = np.asarray(slot_codes, dtype=np.int32)
+        self.room_codes = None if room_codes is None else np.asarray(room_codes, dtype=np.int32)
+
+        self._professor_lookup = {professor: code for code, professor in enumerate(self.professors)}
+        self._by_professor, self._professor_offsets = _offsets(self.professor_codes, len(self.professors))
+        self._by_slot, self._slot_offsets = _offsets(self.slot_codes, len(self.slots))
+
+        self._period_lookup = {}
+        self.periods = []
+        slot_periods = []
+        for date, time, (_, date_label, time_label, _) in zip(catalog.dates, catalog.times, catalog.labels):
+            code = self._period_lookup.setdefault(period_key(date, time), len(self._period_lookup))
+            if code == len(self.periods):
+                self.periods.append((date_label, time_label))
+            slot_periods.append(code)
+        self.slot_periods = np.array(slot_periods, dtype=np.int32)
+        self.period_keys = list(self._period_lookup)
+        self._by_period, self._period_offsets = _offsets(self.slot_periods, len(self.periods))
+        if self.rooms is not None:
+            self._room_lookup = {room: code for code, room in enumerate(self.rooms)}
+            self._by_room, self._room_offsets = _offsets(self.room_codes, len(self.rooms))
+
+    @classmethod
+    def from_assignments(cls, assignments: pd.DataFrame, catalog, roster=()):
+        """
+        Build the table from the frame returned by extraction.extract_assignments
+        and the SlotCatalog of the same sheet. roster lists every professor of
+        the sheet (extraction.professor_roster), those without assignments included.
+        """
+        professor_codes, professors = pd.factorize(assignments['professor'], use_na_sentinel=False)
+        rooms = room_codes = None
+        if 'local' in assignments:
+            room_codes, rooms = pd.factorize(assignments['local'])
+        assigned = set(professors)
+        unassigned = [professor for professor in roster if professor not in assigned]
+        return cls(professors, catalog, rooms, professor_codes, assignments['slot'].to_numpy(), room_codes, unassigned)
+
+    @property
+    def assignment_count(self):
+        return len(self.professor_codes)
+
+    def _record(self, index):
+        schedule_info = dict(zip(SLOT_FIELDS, self.catalog.fields(self.slot_codes[index])))
+        if self.rooms is not None:
+            schedule_info['local'] = self.rooms[self.room_codes[index]]
+        return schedule_info
+
+    def assignment_indexes(self, professor):
+        """
+        Return the assignment rows of a professor, in sheet order.
+        """
+        code = self._professor_lookup[professor]
+        return self._by_professor[self._professor_offsets[code]:self._professor_offsets[code + 1]]
+
+    def display_rows(self, professor, chronological=True):
+        """
+        Return the letter table of a professor: one list of strings per
+        assignment (subject, date, time, niveau[, local]), in chronological
+        order or in sheet order. The slot strings are the catalog's, formatted once.
+        """
+        indexes = self.assignment_indexes(professor)
+        slots = self.slot_codes[indexes]
+        if chronological:
+            order = np.argsort(self.catalog.rank[slots], kind='stable')
+            indexes, slots = indexes[order], slots[order]
+        labels = self.catalog.labels
+        if self.rooms is None:
+            return [list(labels[slot]) for slot in slots]
+        return [list(labels[slot]) + [str(self.rooms[room])] for slot, room in zip(slots, self.room_codes[indexes])]
+
+    def invigilators_of(self, slot):
+        """
+        Return the professors assigned to a slot (its position in self.slots).
+        """
+        indexes = self._by_slot[self._slot_offsets[slot]:self._slot_offsets[slot + 1]]
+        return [self.professors[code] for code in self.professor_codes[indexes]]
+
+    @property
+    def period_codes(self):
+        """
+        Period of every assignment.
+        """
+        return self.slot_periods[self.slot_codes]
+
+    def slots_of(self, professor):
+        """
+        Return the slots (positions in self.slots) a professor invigilates, in sheet order.
+        """
+        return [int(slot) for slot in self.slot_codes[self.assignment_indexes(professor)]]
+
+    def professors_at(self, date, time):
+        """
+        Return the professors invigilating at a (date, time), once per slot they are assigned to.
+        """
+        code = self._period_lookup[period_key(date, time)]
+        slots = self._by_period[self._period_offsets[code]:self._period_offsets[code + 1]]
+        return [professor for slot in slots for professor in self.invigilators_of(slot)]
+
+    def room_slots(self, room):
+        """
+        Return the slots (positions in self.slots) held in a room, in sheet order.
+        """
+        code = self._room_lookup[room]
+        indexes = self._by_room[self._room_offsets[code]:self._room_offsets[code + 1]]
+        return sorted({int(slot) for slot in self.slot_codes[indexes]})
+
+    def __getitem__(self, professor):
+        return [self._record(index) for index in self.assignment_indexes(professor)]
+
+    def __iter__(self):
+        return iter(self.professors)
+
+    def __len__(self):
+        return len(self.professors)
+
+    def __contains__(self, professor):
+        return professor in self._professor_lookup
+
+    def to_dict(self):
+        return {professor: self[professor] for professor in self.professors}
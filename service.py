@@ -0,0 +1,343 @@
+import argparse
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from extraction import STAR_MARK
+from index import generate_docx, process_workbook
+from pipeline import load_schedule_data
+from schedule_cache import cached_schedule, workbook_hash
+
+OUTPUT_PREFIX = 'invitations_profs_'
+CHECKS_SUFFIX = '_checks.xlsx'
+
+
+def _percentile(values, fraction):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Metrics:
+    """
+    Counts and latencies of the generations served, for GET /metrics.
+    The latency of a request runs from its arrival to the end of its
+    generation, the time spent waiting in the queue included.
+    """
+
+    def __init__(self, window=1000):
+        self.started = time.time()
+        self.requests = 0
+        self.failed = 0
+        self.cache = {'memory': 0, 'disk': 0, 'parsed': 0}
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, cache=None, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.failed += failed
+            if cache is not None:
+                self.cache[cache] += 1
+            self._latencies.append(latency)
+
+    def as_dict(self, queued=0):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            hits = self.cache['memory'] + self.cache['disk']
+            lookups = hits + self.cache['parsed']
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'requests': self.requests,
+                'failed': self.failed,
+                'queued': queued,
+                'latency_ms': {
+                    name: round(_percentile(latencies, fraction) * 1000, 1) if latencies else None
+                    for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+                },
+                'cache': dict(self.cache, hit_rate=round(hits / lookups, 3) if lookups else None),
+            }
+
+
+class TableCache:
+    """
+    Parsed schedules kept in memory by workbook content, the least recently
+    used dropped beyond size, in front of the disk cache of schedule_cache.
+    get tells where the table came from: 'memory', 'disk' or 'parsed'.
+    """
+
+    def __init__(self, size=16):
+        self.size = size
+        self._tables = OrderedDict()
+
+    def get(self, file_path, streaming=False):
+        key = workbook_hash(file_path)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key], 'memory'
+        parsed = []
+
+        def parse():
+            parsed.append(True)
+            return load_schedule_data(file_path, STAR_MARK, streaming)
+
+        # the workbook is hashed once, for both caches
+        schedule_data = cached_schedule(file_path, STAR_MARK, parse, digest=key)
+        self._tables[key] = schedule_data
+        while len(self._tables) > self.size:
+            self._tables.popitem(last=False)
+        return schedule_data, 'parsed' if parsed else 'disk'
+
+
+class Job:
+    """
+    One workbook to turn into convocations, waited on through done.
+    """
+
+    def __init__(self, workbook, session, periode, au, output, checks=True, incremental=True):
+        self.workbook = workbook
+        self.session, self.periode, self.au = session, periode, au
+        self.output = output
+        self.checks = checks
+        self.incremental = incremental
+        self.arrived = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GenerationService:
+    """
+    Generates convocations in a process that stays up, so that a request only
+    pays for its own workbook: the libraries are imported once, the parsed
+    schedules stay in memory (TableCache), the letter layout of every session,
+    periode and year is prepared once with the logo (index.generate_docx
+    renderers) and the letters are rendered incrementally, only those changed
+    since the last run on the same workbook and options being rendered again.
+    The logo is read once: restart the service when it changes.
+
+    Requests are queued and handled one at a time by a single worker thread.
+    """
+
+    def __init__(self, output_dir, logo_path='endark.png', session="Normale", periode="Printemps", au="2023/2024",
+                 tables=16, queue_size=64, streaming=False):
+        self.output_dir = output_dir
+        self.logo_path = logo_path
+        self.defaults = {'session': session, 'periode': periode, 'au': au}
+        self.streaming = streaming
+        self.tables = TableCache(tables)
+        self.renderers = {}
+        # the workbooks written by the service, not to be taken for schedules by watch
+        self.written = set()
+        self.metrics = Metrics()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._worker = threading.Thread(target=self._run, name='generation', daemon=True)
+
+    def start(self):
+        self.warm_up()
+        self._worker.start()
+
+    def warm_up(self):
+        """
+        Go once through what the first generation would load lazily: the Excel
+        reader, then the base document, the logo and the letter template of the
+        default options, which stay prepared for the requests.
+        """
+        workbook = io.BytesIO()
+        pd.DataFrame([[0]]).to_excel(workbook, header=False, index=False)
+        workbook.seek(0)
+        pd.read_excel(workbook, header=None, engine='openpyxl')
+        generate_docx({}, self.defaults['session'], self.defaults['periode'], self.defaults['au'],
+                      logo_path=self.logo_path, filename=io.BytesIO(), renderers=self.renderers)
+
+    def output_path(self, workbook, session, periode):
+        stem = os.path.splitext(os.path.basename(workbook))[0]
+        return os.path.join(self.output_dir, f"{OUTPUT_PREFIX}{stem}_{session}_{periode}.docx")
+
+    def job(self, workbook, session=None, periode=None, au=None, output=None, checks=True, incremental=True):
+        session = session or self.defaults['session']
+        periode = periode or self.defaults['periode']
+        au = au or self.defaults['au']
+        return Job(workbook, session, periode, au, output or self.output_path(workbook, session, periode), checks, incremental)
+
+    def submit(self, job):
+        """
+        Queue job; raises queue.Full when too many requests are waiting.
+        """
+        self.queue.put_nowait(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            cache = None
+            try:
+                schedule_data, cache = self.tables.get(job.workbook, self.streaming)
+                os.makedirs(os.path.dirname(os.path.abspath(job.output)), exist_ok=True)
+                checks_path = f"{os.path.splitext(job.output)[0]}{CHECKS_SUFFIX}" if job.checks else None
+                if checks_path:
+                    self.written.add(os.path.abspath(checks_path))
+                job.result = process_workbook(job.workbook, [(job.session, job.periode, job.output)], job.au, self.logo_path,
+                                              incremental=job.incremental, checks_path=checks_path,
+                                              schedule_data=schedule_data, renderers=self.renderers)
+                job.result['cache'] = cache
+            except Exception as error:
+                job.error = error
+            finally:
+                latency = time.perf_counter() - job.arrived
+                self.metrics.record(latency, cache, failed=job.error is not None)
+                if job.error is not None:
+                    print(f"{job.workbook}: failed: {job.error}", file=sys.stderr, flush=True)
+                else:
+                    print(f"{job.workbook}: {job.result['professors']} professors, schedule from {cache}, {latency * 1000:.0f} ms",
+                          file=sys.stderr, flush=True)
+                job.done.set()
+                self.queue.task_done()
+
+    def watch(self, folder, interval=0.5):
+        """
+        Poll folder for new or updated .xlsx workbooks and queue their
+        generation. A workbook still being written is not a complete zip file
+        yet: it is left for a later poll. The workbooks already there are
+        generated at start. The checks workbooks the service writes are not
+        schedules: those of this process and those named after output_path
+        are skipped, so that folder may be the output directory.
+        """
+        seen = {}
+        while True:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError as error:
+                print(f"watch: {error}", file=sys.stderr)
+                entries = []
+            for entry in entries:
+                if not entry.name.lower().endswith('.xlsx') or entry.name.startswith('~$'):  # skip Excel lock files
+                    continue
+                if (entry.name.startswith(OUTPUT_PREFIX) and entry.name.endswith(CHECKS_SUFFIX)
+                        or os.path.abspath(entry.path) in self.written):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if seen.get(entry.path) == signature or not zipfile.is_zipfile(entry.path):
+                    continue
+                try:
+                    self.submit(self.job(entry.path))
+                except queue.Full:
+                    continue  # retried on the next poll
+                seen[entry.path] = signature
+            time.sleep(interval)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /generate   {"workbook": path, "session", "periode", "au", "output", "checks", "incremental"}
+                     waits for the documents and answers with the run's outputs and timings
+    GET  /metrics    requests, latency percentiles and schedule cache hit rate
+    GET  /health
+    """
+
+    server_version = 'convocations'
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/metrics':
+            self._reply(200, service.metrics.as_dict(service.queue.qsize()))
+        elif self.path == '/health':
+            self._reply(200, {'status': 'ok'})
+        else:
+            self._reply(404, {'error': f"unknown path {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != '/generate':
+            self._reply(404, {'error': f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            workbook = request['workbook']
+        except (ValueError, KeyError, TypeError):
+            self._reply(400, {'error': 'expected a JSON object with a "workbook" path'})
+            return
+        if not os.path.isfile(workbook):
+            self._reply(404, {'error': f"no workbook at {workbook}"})
+            return
+        options = {name: request.get(name) for name in ('session', 'periode', 'au', 'output')}
+        job = service.job(workbook, checks=request.get('checks', True), incremental=request.get('incremental', True), **options)
+        try:
+            service.submit(job)
+        except queue.Full:
+            self._reply(503, {'error': 'too many requests waiting'})
+            return
+        job.done.wait()
+        if job.error is not None:
+            self._reply(500, {'error': f"{type(job.error).__name__}: {job.error}"})
+            return
+        result = job.result
+        self._reply(200, {
+            'outputs': result['outputs'], 'professors': result['professors'], 'conflicts': result['conflicts'],
+            'cache': result['cache'], 'latency_ms': round((time.perf_counter() - job.arrived) * 1000, 1),
+            'report': result['report'].as_dict(),
+        })
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the generation of convocations on localhost, caches kept warm between requests.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (localhost only by default)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--watch", metavar="DIR", default=None, help="generate the convocations of every .xlsx dropped or updated in DIR")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between two scans of the watched folder")
+    parser.add_argument("--output-dir", default=".", help="directory receiving the documents when a request names none")
+    parser.add_argument("--session", default="Normale")
+    parser.add_argument("--periode", default="Printemps")
+    parser.add_argument("--au", default="2023/2024", help="année universitaire (20XX/20YY)")
+    parser.add_argument("--logo", default="endark.png", help="logo printed on top of every letter")
+    parser.add_argument("--streaming", action="store_true", help="read the workbooks row by row")
+    parser.add_argument("--tables", type=int, default=16, help="parsed workbooks kept in memory")
+    parser.add_argument("--queue-size", type=int, default=64, help="requests waiting before new ones are refused")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    service = GenerationService(args.output_dir, args.logo, args.session, args.periode, args.au,
+                                args.tables, args.queue_size, args.streaming)
+    start = time.perf_counter()
+    service.start()
+    server = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+    server.service = service
+    if args.watch:
+        threading.Thread(target=service.watch, args=(args.watch, args.interval), name='watch', daemon=True).start()
+    print(f"ready in {time.perf_counter() - start:.2f} s, listening on http://{args.host}:{server.server_address[1]}"
+          + (f", watching {args.watch}" if args.watch else ""), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import datetime
+import re
+
+import numpy as np
+import pandas as pd
+
+# 12/02/2024, 12-02-2024 or 12.02.24, the same separator twice
+DATE_PATTERN = re.compile(r'(\d{1,2})([/.-])(\d{1,2})\2(\d{2,4})')
+TIME_PATTERN = re.compile(r'(\d{1,2})\s*[hH:]\s*(\d{2})')
+
+
+def _is_missing(value):
+    return value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value))
+
+
+def parse_day(value):
+    """
+    Return the day of a date header ("Lundi 12/02/2024", "Lundi 12-02-2024", a Timestamp...) or None.
+    """
+    if _is_missing(value):
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    match = DATE_PATTERN.search(str(value)) if isinstance(value, str) else None
+    if match is None:
+        return None
+    day, _, month, year = match.groups()
+    day, month, year = int(day), int(month), int(year)
+    try:
+        return datetime.date(year + 2000 if year < 100 else year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_time_range(value):
+    """
+    Return the (start, end) times of a time header ("09H30 - 11H00"), end or both being None
+    when missing.
+    """
+    if _is_missing(value):
+        return None, None
+    if isinstance(value, datetime.datetime):
+        return value.time(), None
+    if isinstance(value, datetime.time):
+        return value, None
+    if not isinstance(value, str):
+        return None, None
+    times = []
+    for hour, minute in TIME_PATTERN.findall(value)[:2]:
+        try:
+            times.append(datetime.time(int(hour), int(minute)))
+        except ValueError:
+            break
+    times += [None] * (2 - len(times))
+    return times[0], times[1]
+
+
+def format_cell(value):
+    """
+    Text printed in the letters for a header cell. Dates read by Excel as
+    datetimes lose their 00:00:00, empty cells print nothing.
+    """
+    if _is_missing(value):
+        return ""
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.strftime('%d/%m/%Y')
+        return value.strftime('%d/%m/%Y %H:%M')
+    if isinstance(value, datetime.date):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, datetime.time):
+        return f"{value.hour:02d}H{value.minute:02d}"
+    return str(value)
+
+
+def period_key(date, time):
+    """
+    Key of the period a slot takes place at: its (day, start time) when both
+    parse, so that the same period typed differently on two sheets matches,
+    else its (date, time) as printed.
+    """
+    day, (start, _) = parse_day(date), parse_time_range(time)
+    if day is None or start is None:
+        return format_cell(date), format_cell(time)
+    return day, start
+
+
+class SlotCatalog:
+    """
+    The exam columns of a workbook, read once from the header rows.
+
+    For every column of the sheet (positions as in the pretreated frame):
+    the raw subject, date, time and niveau, the parsed day and time range
+    (None when a header cannot be parsed) and the strings printed in the
+    letters, formatted once. rank orders the columns chronologically, the
+    unparsable ones last, in sheet order. sheets names the sheet of every
+    column when the catalog covers several (concat).
+    """
+
+    def __init__(self, subjects, dates, times, niveaux, sheets=None):
+        self.subjects = list(subjects)
+        self.dates = list(dates)
+        self.times = list(times)
+        self.niveaux = list(niveaux)
+        self.sheets = [None] * len(self.subjects) if sheets is None else list(sheets)
+        self.days = [parse_day(date) for date in self.dates]
+        self.time_ranges = [parse_time_range(time) for time in self.times]
+        self.labels = [
+            tuple(format_cell(value) for value in fields)
+            for fields in zip(self.subjects, self.dates, self.times, self.niveaux)
+        ]
+
+        def chronological(column):
+            day, (start, _) = self.days[column], self.time_ranges[column]
+            return (day is None, day or datetime.date.min, start is None, start or datetime.time.min, column)
+
+        self.rank = np.empty(len(self.subjects), dtype=np.int32)
+        self.rank[sorted(range(len(self.subjects)), key=chronological)] = np.arange(len(self.subjects), dtype=np.int32)
+
+    @classmethod
+    def concat(cls, catalogs, names):
+        """
+        One catalog for several sheets: the columns of each catalog follow
+        those of the previous ones, tagged with the name of their sheet.
+        """
+        columns = [[value for catalog in catalogs for value in getattr(catalog, field)]
+                   for field in ('subjects', 'dates', 'times', 'niveaux')]
+        sheets = [name for catalog, name in zip(catalogs, names) for _ in range(len(catalog))]
+        return cls(*columns, sheets=sheets)
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def fields(self, column):
+        """
+        Raw (subject, date, time, niveau) of a column.
+        """
+        return self.subjects[column], self.dates[column], self.times[column], self.niveaux[column]
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'sheet': self.sheets,
+            'subject': self.subjects, 'date': self.dates, 'time': self.times, 'niveau': self.niveaux,
+            'day': self.days,
+            'start': [start for start, _ in self.time_ranges], 'end': [end for _, end in self.time_ranges],
+            'rank': self.rank,
+        })
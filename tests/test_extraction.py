@@ -0,0 +1,162 @@
+"""
+The vectorized extraction, the parsing pipeline and the streaming reader
+against the original per-cell loop of grouping_profs_info_in_a_dict, kept
+here as the reference.
+"""
+import os
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from extraction import ROOM_MARK, STAR_MARK, extract_assignments, extract_slot_catalog
+from index import grouping_profs_info_in_a_dict, read_excel_file
+from ingestion import stream_assignments
+from instrumentation import PipelineReport
+from pipeline import load_schedule_data, pretreatment
+from schedule_table import ScheduleTable
+from slot_catalog import period_key
+from synthetic import write_synthetic_schedule
+
+
+def reference_schedule(raw_data_df, processed_data_df, mark):
+    """
+    The per-cell loop the scripts used before extraction.py, both flavours.
+    """
+    schedule_data = {}
+    for x, row in enumerate(processed_data_df.values):
+        cells = enumerate(row) if mark == STAR_MARK else enumerate(row[1:-2], start=1)
+        for y, value in cells:
+            if mark == STAR_MARK:
+                marked = value == "*"
+            else:
+                marked = not pd.isna(value) and value[-1].isdigit()
+            if marked:
+                professor = processed_data_df.iloc[x, 0]
+                schedule_info = {'subject': raw_data_df.iloc[4, y], 'date': raw_data_df.iloc[0, y],
+                                 'time': raw_data_df.iloc[1, y], 'niveau': raw_data_df.iloc[3, y]}
+                if mark == ROOM_MARK:
+                    schedule_info['local'] = value
+                schedule_data.setdefault(professor, []).append(schedule_info)
+    return schedule_data
+
+
+def normalized(schedule_data, strip=False):
+    """
+    Comparable form of a schedule: NaN as None and, with strip, the names
+    without their surrounding spaces, as merge_sheets compares them.
+    """
+    def name(professor):
+        return professor.strip() if strip and isinstance(professor, str) else professor
+
+    return {
+        name(professor): [{field: None if pd.isna(value) else value for field, value in info.items()} for info in infos]
+        for professor, infos in schedule_data.items()
+    }
+
+
+@pytest.fixture(scope='module')
+def workbooks(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('workbooks')
+    paths = {('schedule.xlsx', ROOM_MARK): os.path.join(ROOT, 'schedule.xlsx')}
+    for mark, flavour in ((STAR_MARK, 'star'), (ROOM_MARK, 'room')):
+        path = str(directory / f'synthetic_{flavour}.xlsx')
+        write_synthetic_schedule(path, professors=60, slots=40, density=0.1, mark=flavour, merged=True)
+        paths[('synthetic', mark)] = path
+    return paths
+
+
+CASES = [('schedule.xlsx', ROOM_MARK), ('synthetic', STAR_MARK), ('synthetic', ROOM_MARK)]
+
+
+def reference(path, mark):
+    raw_data_df = read_excel_file(path)
+    return reference_schedule(raw_data_df, pretreatment(raw_data_df), mark)
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_extract_assignments_matches_loop(workbooks, case):
+    path = workbooks[case]
+    expected = reference(path, case[1])
+    assert expected, "the workbook must hold marked cells for the comparison to mean anything"
+
+    raw_data_df = read_excel_file(path)
+    processed_data_df = pretreatment(raw_data_df)
+    table = ScheduleTable.from_assignments(extract_assignments(raw_data_df, processed_data_df, case[1]),
+                                           extract_slot_catalog(raw_data_df))
+    assert normalized(table.to_dict()) == normalized(expected)
+    assert list(table) == list(expected)
+
+
+def test_grouping_matches_loop(workbooks):
+    path = workbooks[('synthetic', STAR_MARK)]
+    raw_data_df = read_excel_file(path)
+    schedule_data = grouping_profs_info_in_a_dict(raw_data_df, pretreatment(raw_data_df))
+    assert normalized(schedule_data.to_dict()) == normalized(reference(path, STAR_MARK))
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('case', CASES)
+def test_load_schedule_data_matches_loop(workbooks, case, streaming):
+    path = workbooks[case]
+    table = load_schedule_data(path, case[1], streaming)
+    assert normalized(table.to_dict()) == normalized(reference(path, case[1]), strip=True)
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_stream_assignments_matches_extraction(workbooks, case):
+    path = workbooks[case]
+    raw_data_df = read_excel_file(path)
+    processed_data_df = pretreatment(raw_data_df)
+    expected = extract_assignments(raw_data_df, processed_data_df, case[1])
+    assignments, catalog, _ = stream_assignments(path, case[1])
+    assert assignments['slot'].tolist() == expected['slot'].tolist()
+    # the streaming reader strips the names as it goes, see below
+    assert assignments['professor'].tolist() == expected['professor'].str.strip().tolist()
+    # the catalogs may differ on trailing unmarked columns, not on the marked ones
+    expected_catalog = extract_slot_catalog(raw_data_df)
+    assert [catalog.labels[slot] for slot in assignments['slot']] == [expected_catalog.labels[slot] for slot in expected['slot']]
+
+
+def test_names_are_stripped_when_sheets_are_merged(tmp_path):
+    # Since the multi-sheet reading, the pipeline compares the professors
+    # without their surrounding spaces, so that the same name typed on two
+    # department sheets gives one letter; the per-cell loop kept them.
+    path = str(tmp_path / 'padded.xlsx')
+    write_synthetic_schedule(path, professors=10, slots=20, density=0.3, merged=True)
+    workbook = openpyxl.load_workbook(path)
+    workbook.active.cell(row=10, column=2).value = '  Pr. Synthetic 0 '
+    workbook.save(path)
+
+    expected = reference(path, STAR_MARK)
+    assert '  Pr. Synthetic 0 ' in expected
+    for streaming in (False, True):
+        table = load_schedule_data(path, STAR_MARK, streaming)
+        assert 'Pr. Synthetic 0' in table and '  Pr. Synthetic 0 ' not in table
+        assert normalized(table.to_dict()) == normalized(expected, strip=True)
+
+
+def test_sheets_are_read_whatever_their_date_separator(tmp_path):
+    # a second department typing its dates "Lundi 12-02-2024", and a sheet that is no schedule
+    path = str(tmp_path / 'departments.xlsx')
+    write_synthetic_schedule(path, professors=10, slots=20, density=0.3)
+    workbook = openpyxl.load_workbook(path)
+    chimie = workbook.copy_worksheet(workbook.active)
+    chimie.title = 'Chimie'
+    for cell in chimie[4]:
+        if isinstance(cell.value, str):
+            cell.value = cell.value.replace('/', '-')
+    for row in range(10, 20):
+        chimie.cell(row=row, column=2).value = f'Pr. Chimie {row - 10}'
+    workbook.create_sheet('Notes')['A1'] = "Salles disponibles"
+    workbook.save(path)
+
+    for streaming in (False, True):
+        report = PipelineReport()
+        table = load_schedule_data(path, STAR_MARK, streaming, report=report)
+        assert {'Pr. Synthetic 0', 'Pr. Chimie 0'} <= set(table)
+        read = next(record for record in report.stages if record['stage'] in ('read_excel', 'stream_excel'))
+        assert read['sheets'] == 2
+        assert read['skipped_sheets'] == ['Notes']
+    assert period_key('Lundi 12/02/2024', '08H30 - 10H00') == period_key('Lundi 12-02-2024', '08H30 - 10H00')
@@ -0,0 +1,16 @@
+"""
+The GUIs show their window before the pipeline libraries are loaded
+(benchmarks/check_import_time.py, run here as part of the suite).
+"""
+import pytest
+
+from check_import_time import BUDGET_MS, GUI_SCRIPTS, HEAVY_MODULES, import_times, startup_imports
+
+
+@pytest.mark.parametrize('script', GUI_SCRIPTS)
+def test_startup_imports_stay_light(script):
+    code = startup_imports(script)
+    # best of three, as the script does, against the noise of a loaded machine
+    modules, total = min((import_times(code) for _ in range(3)), key=lambda run: run[1])
+    assert not {name.split('.')[0] for name in modules} & set(HEAVY_MODULES)
+    assert total / 1000 <= BUDGET_MS
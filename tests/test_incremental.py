@@ -0,0 +1,76 @@
+"""
+Letters spliced into the cached document by write_letters_incremental against
+a fresh render of the same letters.
+"""
+import datetime
+import os
+import re
+import zipfile
+from functools import partial
+
+import pytest
+from docx import Document
+from docx.shared import Inches
+
+from bench_logo import write_noise_png
+from incremental import write_letters_incremental
+from index import add_letter
+from letters import write_letters
+
+LAYOUT = partial(add_letter, session="Normale", periode="Printemps", au="2023/2024", today=datetime.date(2024, 2, 1))
+SHAPE_ID = re.compile(r'<wp:docPr id="(\d+)" name="Picture \d+"')
+
+
+def rows(*subjects):
+    return [[subject, 'Lundi 12/02/2024', '08H30 - 10H00', 'S2'] for subject in subjects]
+
+
+def document_xml(path):
+    with zipfile.ZipFile(path) as package:
+        return package.read('word/document.xml').decode('utf-8')
+
+
+def letter_count(path):
+    return sum(1 for paragraph in Document(path).paragraphs if 'Pr. ' in paragraph.text)
+
+
+@pytest.fixture
+def render(tmp_path):
+    logo_path = str(tmp_path / 'logo.png')
+    write_noise_png(logo_path, 4 * 1024)
+
+    def render(letters, name='incremental.docx'):
+        filename = str(tmp_path / name)
+        saved = write_letters_incremental(filename, Document, LAYOUT, 4, logo_path, Inches(4), letters, ('schedule.xlsx',),
+                                          f"{os.path.splitext(filename)[0]}_changes.docx", cache_dir=str(tmp_path / 'cache'))
+        fresh = str(tmp_path / 'fresh.docx')
+        write_letters(fresh, Document, LAYOUT, 4, logo_path, Inches(4), letters)
+        return saved, fresh
+
+    return render
+
+
+def test_splice_matches_a_fresh_render(render, tmp_path):
+    first = [('Pr. A', rows('Analyse')), ('Pr. B', rows('Algèbre', 'Optique')), ('Pr. C', rows('Chimie', 'Physique', 'Géologie')),
+             ('Pr. D', rows('Botanique')), ('Pr. E', rows('Zoologie', 'Écologie'))]
+    render(first)
+
+    # B changed, C removed, D renamed, F new, and the order changed
+    second = [first[4], ('Pr. B', rows('Mécanique')), first[0], ('Pr. D bis', rows('Botanique')), ('Pr. F', rows('Statistique', 'Probabilités'))]
+    saved, fresh = render(second)
+    spliced, changes = saved
+    assert changes == str(tmp_path / 'incremental_changes.docx')
+    assert letter_count(changes) == 3
+
+    spliced_xml, fresh_xml = document_xml(spliced), document_xml(fresh)
+    # the spliced letters take the shape ids left free, the rest is the same document
+    assert SHAPE_ID.sub('<wp:docPr', spliced_xml) == SHAPE_ID.sub('<wp:docPr', fresh_xml)
+    shape_ids = SHAPE_ID.findall(spliced_xml)
+    assert len(shape_ids) == len(second) and len(set(shape_ids)) == len(shape_ids)
+    assert set(re.findall(r'r:embed="(\w+)"', spliced_xml)) == set(re.findall(r'r:embed="(\w+)"', fresh_xml))
+
+    # nothing changed: the full document is copied, the stale changes removed
+    saved, _ = render(second)
+    assert saved == [spliced]
+    assert not os.path.exists(changes)
+    assert SHAPE_ID.sub('<wp:docPr', document_xml(spliced)) == SHAPE_ID.sub('<wp:docPr', fresh_xml)
@@ -0,0 +1,78 @@
+"""
+The conflicts and load sheets of schedule_checks on a small hand-made workbook.
+"""
+import openpyxl
+import pytest
+
+from extraction import STAR_MARK
+from pipeline import load_schedule_data
+from schedule_checks import find_conflicts, professor_load
+
+
+def add_schedule_sheet(sheet, slots, marks):
+    """
+    Lay out sheet as the faculty's schedules: 3 title rows, the date, time,
+    duration, niveau and subject rows, the "Enseignants" row, then one row per
+    professor. slots holds the (date, time, subject) of each column, marks the
+    columns of each professor.
+    """
+    sheet.append([])
+    sheet.append([None, None, 'Calendrier de Surveillance des examens'])
+    sheet.append([])
+    sheet.append([None, None] + [date for date, _, _ in slots])
+    sheet.append([None, None] + [time for _, time, _ in slots])
+    sheet.append([None, None] + ['1h30'] * len(slots))
+    sheet.append([None, 'Semestre'] + ['S2'] * len(slots))
+    sheet.append([None, 'Module'] + [subject for _, _, subject in slots])
+    sheet.append([None, 'Enseignants'] + [None] * len(slots) + ['Total', 'Total Hs'])
+    for professor, columns in marks.items():
+        sheet.append(['Département'] + [professor] + ['*' if column in columns else None for column in range(len(slots))]
+                     + [len(columns), len(columns) * 1.5])
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'checks.xlsx')
+    book = openpyxl.Workbook()
+    add_schedule_sheet(book.active, [
+        ('Lundi 12/02/2024', '08H30 - 10H00', 'Analyse'),
+        ('Lundi 12/02/2024', '08H30 - 10H00', 'Algèbre'),
+        ('Lundi 12/02/2024', '10H30 - 12H00', 'Optique'),
+    ], {
+        'Pr. Amrani': {0, 1},    # two exams at once
+        'Pr. Bennani': {0, 2},
+        'Pr. Chafik': set(),
+        'Pr. Drissi': set(),
+    })
+    # another department, typing its dates differently
+    add_schedule_sheet(book.create_sheet('Chimie'), [
+        ('Lundi 12-02-2024', '10H30 - 12H00', 'Chimie organique'),
+    ], {
+        'Pr. Bennani': {0},     # already at Optique
+        'Pr. Elidrissi': set(),
+    })
+    book.save(path)
+    return path
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_conflicts(workbook, streaming):
+    conflicts = find_conflicts(load_schedule_data(workbook, STAR_MARK, streaming))
+    assert conflicts[['professor', 'subject']].values.tolist() == [
+        ['Pr. Amrani', 'Analyse'], ['Pr. Amrani', 'Algèbre'],
+        ['Pr. Bennani', 'Optique'], ['Pr. Bennani', 'Chimie organique'],
+    ]
+    assert conflicts['sheet'].tolist()[2:] == ['Sheet', 'Chimie']
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_load_lists_unassigned_professors(workbook, streaming):
+    load = professor_load(load_schedule_data(workbook, STAR_MARK, streaming)).set_index('professor')
+    assert load['assignments'].to_dict() == {
+        'Pr. Amrani': 2, 'Pr. Bennani': 3, 'Pr. Chafik': 0, 'Pr. Drissi': 0, 'Pr. Elidrissi': 0,
+    }
+    assert load.loc['Pr. Chafik', ['periods', 'days']].tolist() == [0, 0]
+    # the average counts the professors without assignments: 5 / 5
+    assert load['vs_average'].to_dict() == {
+        'Pr. Amrani': 1.0, 'Pr. Bennani': 2.0, 'Pr. Chafik': -1.0, 'Pr. Drissi': -1.0, 'Pr. Elidrissi': -1.0,
+    }
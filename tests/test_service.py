@@ -0,0 +1,38 @@
+"""
+The generation service watching the folder it writes its documents into.
+"""
+import os
+import threading
+import time
+
+from bench_logo import write_noise_png
+from service import GenerationService
+from synthetic import write_synthetic_schedule
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_watch_skips_its_own_checks_workbooks(tmp_path):
+    logo_path = str(tmp_path / 'logo.png')
+    write_noise_png(logo_path, 4 * 1024)
+    folder = tmp_path / 'w'
+    folder.mkdir()
+    service = GenerationService(str(folder), logo_path)
+    service.start()
+    write_synthetic_schedule(str(folder / 'syn.xlsx'), professors=20, slots=20, density=0.2)
+    threading.Thread(target=service.watch, args=(str(folder), 0.05), daemon=True).start()
+
+    output = service.output_path(str(folder / 'syn.xlsx'), 'Normale', 'Printemps')
+    wait_for(lambda: service.metrics.requests >= 1)
+    assert os.path.exists(output)
+    assert os.path.exists(f"{os.path.splitext(output)[0]}_checks.xlsx")
+    # the checks workbook lies in the watched folder for a few more polls
+    time.sleep(0.5)
+    service.queue.join()
+    assert service.metrics.requests == 1
+    assert service.metrics.failed == 0